@@ -1,5 +1,22 @@
-from monte_carlo_sim.file_writing.file_writing import create_results_folder, write_s_csv, write_s_readme, write_g_csv, write_g_readme
-from monte_carlo_sim.simulation.run_simulation import run_simulations, run_generation_simulations
+import sys
+import argparse
+import numpy as np
+from pathlib import Path
+from numba import set_num_threads
+from monte_carlo_sim.file_writing.file_writing import (create_results_folder, stream_s_csv, stream_s_npy, finalize_s_npy,
+                                                       write_s_readme, write_g_csv, write_g_readme, write_summary_csv,
+                                                       save_checkpoint, load_checkpoint, clear_checkpoint,
+                                                       write_sweep_index, write_sensitivity_csv, write_deposition_csv,
+                                                       write_spectra_csv)
+from monte_carlo_sim.simulation.run_simulation import (run_simulations, run_generation_simulations, run_summary_simulations,
+                                                       run_multi_energy_simulations, warmup, degradation_spectrum,
+                                                       monitored_columns)
+from monte_carlo_sim.simulation.rng import resolve_seed
+from monte_carlo_sim.simulation.sharding import run_shard, run_sharded, merge_shards
+from monte_carlo_sim.simulation.species import stoichiometry, write_species_moments, write_species_summary, write_species_generations
+from monte_carlo_sim.simulation.sensitivity import (run_sensitivity_simulations, sensitivity_channels, sensitivity_matrix,
+                                                    warmup_sensitivity)
+from monte_carlo_sim.simulation.trace import run_traces, warmup_traces
 from monte_carlo_sim.simulation.constants import code_names, delta_k, reaction_produced
 
 """
@@ -13,7 +30,61 @@ Inputs:
     - Incident Energy (eV): The starting kinetic energy of the primary electron.
     - Cut-off Energy (eV): The threshold below which tracking ceases.
     - Total Simulations: Number of independent Monte Carlo trials.
-    - Data Type: Choice between Standard (per-simulation) or Generational (event-tiered) output.
+    - Data Type: Choice between Standard (per-simulation), Generational (event-tiered) or
+      Summary (per-channel mean/variance/confidence interval, no per-simulation rows) output.
+    - Output Format (Standard only): CSV text, or Binary .npy columns with a results.json sidecar
+      that file_writing.load_s_results reads back.
+    - Random Seed (optional): Reruns with the same seed and inputs reproduce every simulation
+      exactly, independent of chunking and thread count. Left blank, a fresh seed is drawn and
+      recorded in the results README.
+    - Standard and Summary runs also write deposition.csv, the energy deposited per channel, and
+      check energy conservation for every chunk (reported in the README).
+    - Every run also writes species.csv: the species produced by the reactive events
+      (constants.reaction_produced) with their G-values (see simulation/species.py).
+    - mrie run --spectrum-bins N (Standard / Summary) also records the electron spectra inside the
+      kernel and writes spectra.csv (see run_simulation.py SPECTRA).
+    - mrie run --trace-every K also records the ordered collisions (event, energy, generation) of
+      every K-th simulation in trace.bin / trace_index.npy (see simulation/trace.py).
+    - Target Relative Standard Error (Standard / Summary, optional): Treats Total Simulations as
+      an upper limit and stops once every event channel's mean has reached this precision.
+    - Monitored Channels (with a target, optional): The channels (code names or indices) that have to
+      reach the target, e.g. Ion_1, Ion_2, C III; left blank, every channel open at the incident energy,
+      where rare photon lines can keep a run from stopping early. mrie run --monitor does the same.
+
+Non-interactive runs (mrie <command> --help lists every flag):
+    mrie run --energy 100000 --cut-off 1 --simulations 10000 --mode summary --seed 42 --threads 8
+        One run with the same choices as the prompts, plus --sampler and --threads.
+    mrie sweep --energy-range 100 100000 50 --cut-offs 1 10 --simulations 10000 --mode summary
+        Every energy/cut-off pair in one process, so numba compiles the kernels only once. Each point
+        gets its own results folder under --output, listed in sweep.csv. With --seed every point uses
+        the same seed (common random numbers, which smooths yield curves across energies).
+        Analytic summary sweeps (without --target-rse, --spectrum-bins or --trace-every) run all
+        energies of a cut-off in one multi-energy kernel launch (run_simulation.run_multi_energy_simulations),
+        which keeps every thread busy while the cheap low-energy points finish early. Table and alias
+        sweeps run point by point, since one shared table would not match a single run's grid.
+    mrie sensitivity --energy 10000 --cut-off 1 --simulations 10000 --factor 1.1 --seed 42
+        Scales each open channel's cross section by --factor (or only --channels) and measures the
+        response of every channel in one run with common random numbers (see
+        simulation/sensitivity.py). Writes results.csv for the unperturbed baseline, plus
+        sensitivity.csv and sensitivity_error.csv, the relative sensitivity matrix and its
+        standard errors.
+    mrie warmup
+        Compiles every kernel into numba's on-disk cache (e.g. while building a container image)
+        and prints the compile or load time of each.
+
+Sharded runs (see simulation/sharding.py):
+    mrie shard --energy 100000 --cut-off 1 --simulations 1000000 --shards 8 --seed 42
+        Runs all 8 shards in local processes and merges them into one results folder.
+    mrie shard ... --shards 8 --shard 3 --seed 42 --output DIR
+        Runs only shard 3 into DIR/shard_0003 (one invocation per node, same seed and DIR layout).
+    mrie merge DIR/shard_* [--output DIR]
+        Combines shard folders into one results folder identical to a single-process run.
+
+Checkpoints:
+    Every run saves checkpoint.npz into its results folder about once a minute and removes it when
+    the results are written. After an interruption, mrie resume DIR continues from the last
+    checkpoint and produces the same results as an uninterrupted run. Re-running an interrupted
+    mrie shard --shard k command resumes that shard the same way.
 """
 
 
@@ -34,31 +105,371 @@ def get_valid_input(prompt, max_value=None, type_func=float):
 
 def get_gen_input():
      while True:
-        choice = input("Select Data Type (Standard / Generational): ").strip().lower() or "standard"
+        choice = input("Select Data Type (Standard / Generational / Summary): ").strip().lower() or "standard"
         if choice in ['standard', 's']:
             return 1
         if choice in ['generational', 'g']:
             return 2
-        print("Invalid choice. Please enter 'Standard' or 'Generational'.")
+        if choice in ['summary', 'm']:
+            return 3
+        print("Invalid choice. Please enter 'Standard', 'Generational' or 'Summary'.")
+
+def get_format_input():
+     while True:
+        choice = input("Select Output Format (CSV / Binary): ").strip().lower() or "csv"
+        if choice in ['csv', 'c']:
+            return "csv"
+        if choice in ['binary', 'b', 'npy']:
+            return "npy"
+        print("Invalid choice. Please enter 'CSV' or 'Binary'.")
+
+def get_target_input():
+    while True:
+        entry = input("Enter target relative standard error (blank to run all simulations): ").strip()
+        if not entry:
+            return None
+        try:
+            value = float(entry)
+            if 0 < value < 1:
+                return value
+            print("Error: Value must be between 0 and 1.")
+        except ValueError:
+            print("Invalid input. Please enter a float.")
+
+def parse_channels(entries):
+    return [int(c) if c.isdigit() else c for c in entries]
+
+def get_monitor_input(incident_energy):
+    while True:
+        entry = input("Enter channels to monitor (blank for every open channel): ").strip()
+        if not entry:
+            return None
+        monitor = parse_channels([c.strip() for c in (entry.split(",") if "," in entry else entry.split())])
+        try:
+            monitored_columns(monitor, incident_energy)
+            return monitor
+        except ValueError as error:
+            print(f"Error: {error}.")
+
+def get_seed_input():
+    while True:
+        entry = input("Enter random seed (blank for a random seed): ").strip()
+        if not entry:
+            return None
+        try:
+            value = int(entry)
+            if 0 <= value < 2**64:
+                return value
+            print("Error: Value must be between 0 and 2**64 - 1.")
+        except ValueError:
+            print("Invalid input. Please enter a int.")
+
+data_types = {1: "standard", 2: "generational", 3: "summary"}
+
+def run_and_write(results, run, resume=None):
+    incident_energy = run["initial_energy"]
+    cut_off = run["cut_off"]
+    total_simulations = run["total_simulations"]
+
+    def checkpoint(state):
+        save_checkpoint(results, state, run)
+
+    options = dict(seed=run["seed"], sampler=run.get("sampler", "analytic"), checkpoint=checkpoint, resume=resume)
+    monitor = run.get("monitor")
+    spectrum_bins = run.get("spectrum_bins", 0)
+    if run["mode"] == "standard":
+        if run["format"] == "npy":
+            sink = stream_s_npy(results, code_names, total_simulations, incident_energy, cut_off,
+                                resume=resume is not None)
+        else:
+            sink = stream_s_csv(results, code_names, resume_from=None if resume is None else resume["completed"])
+        _, t_e, e_a, diagnostics = run_simulations(incident_energy, total_simulations, cut_off, sink=sink,
+                                                   target_rse=run["target_rse"], monitor=monitor, spectrum_bins=spectrum_bins,
+                                                   stoichiometry=stoichiometry, **options)
+        if run["format"] == "npy":
+            finalize_s_npy(results, diagnostics["simulations"])
+        write_s_readme(results, incident_energy, cut_off, diagnostics["simulations"], t_e, e_a, diagnostics)
+        write_species_moments(results, incident_energy, *diagnostics["species"])
+        write_deposition_csv(results, diagnostics["deposition"], diagnostics["simulations"], incident_energy, code_names)
+    elif run["mode"] == "summary":
+        count, mean, m2, diagnostics = run_summary_simulations(incident_energy, total_simulations, cut_off,
+                                                               target_rse=run["target_rse"], monitor=monitor,
+                                                               spectrum_bins=spectrum_bins, **options)
+        total = diagnostics["total"]
+        write_summary_csv(results, count, mean, m2, total, code_names)
+        write_species_summary(results, incident_energy, count, mean, m2, total)
+        write_deposition_csv(results, diagnostics["deposition"], count, incident_energy, code_names)
+        write_s_readme(results, incident_energy, cut_off, count, total[28], total[29],
+                       diagnostics, title="Summary Simulation Results")
+    else:
+        data, t_e, e_a, diagnostics = run_generation_simulations(incident_energy, total_simulations, cut_off, **options)
+        write_g_csv(results, data, code_names)
+        write_species_generations(results, data)
+        write_g_readme(results, incident_energy, cut_off, total_simulations, t_e, e_a, diagnostics)
+    if run.get("trace_every"):
+        run_traces(results, incident_energy, diagnostics.get("simulations", total_simulations), run["trace_every"],
+                   cut_off, sampler=run.get("sampler", "analytic"), seed=run["seed"])
+    if "spectra" in diagnostics:
+        simulations = diagnostics["simulations"]
+        spectra, edges = diagnostics["spectra"], diagnostics["spectrum_edges"]
+        write_spectra_csv(results, edges, spectra, degradation_spectrum(spectra[0], edges, simulations), simulations)
+    clear_checkpoint(results)
+    return results
+
+def add_run_arguments(parser):
+    parser.add_argument("--simulations", type=int, required=True, help="simulations per run (upper limit with --target-rse)")
+    parser.add_argument("--mode", choices=list(data_types.values()), default="standard")
+    parser.add_argument("--format", choices=["csv", "npy"], default="csv", help="standard mode output format")
+    parser.add_argument("--seed", type=int, help="random seed (default: fresh entropy, recorded in the README)")
+    parser.add_argument("--target-rse", type=float, help="stop once every open channel reaches this relative standard error")
+    parser.add_argument("--monitor", nargs="+", metavar="CHANNEL",
+                        help="with --target-rse, only these channels (code names or indices) have to reach it")
+    parser.add_argument("--sampler", choices=["analytic", "table", "alias"], default="analytic",
+                        help="event selection (see simulation/sampling.py)")
+    parser.add_argument("--spectrum-bins", type=int, default=0,
+                        help="record the electron spectra in this many log bins (standard / summary, writes spectra.csv)")
+    parser.add_argument("--trace-every", type=int, default=0, metavar="K",
+                        help="record the event sequence of every K-th simulation (writes trace.bin)")
+    parser.add_argument("--threads", type=int, help="numba threads (default: all cores)")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="mrie", description="Monte Carlo Methane Radiolysis Simulation")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run one simulation without prompts")
+    run.add_argument("--energy", type=float, required=True, help="incident energy in eV")
+    run.add_argument("--cut-off", type=float, required=True, help="cut-off energy in eV")
+    add_run_arguments(run)
+    run.add_argument("--output", type=Path, help="results folder (default: a new timestamped folder)")
+
+    sweep = commands.add_parser("sweep", help="run every combination of incident energies and cut-offs in one process")
+    sweep.add_argument("--energies", type=float, nargs="+", default=[], help="incident energies in eV")
+    sweep.add_argument("--energy-range", type=float, nargs=3, metavar=("START", "STOP", "POINTS"),
+                       help="POINTS incident energies from START to STOP eV (inclusive)")
+    sweep.add_argument("--spacing", choices=["log", "linear"], default="log", help="spacing of --energy-range")
+    sweep.add_argument("--cut-offs", type=float, nargs="+", default=[1.0], help="cut-off energies in eV")
+    add_run_arguments(sweep)
+    sweep.add_argument("--output", type=Path, help="folder holding one results folder per point (default: cwd)")
+
+    shard = commands.add_parser("shard", help="run one shard, or every shard in local processes")
+    shard.add_argument("--energy", type=float, required=True, help="incident energy in eV")
+    shard.add_argument("--cut-off", type=float, required=True, help="cut-off energy in eV")
+    shard.add_argument("--simulations", type=int, required=True, help="total simulations over all shards")
+    shard.add_argument("--mode", choices=list(data_types.values()), default="standard")
+    shard.add_argument("--format", choices=["csv", "npy"], default="npy", help="standard mode output format")
+    shard.add_argument("--shards", type=int, required=True)
+    shard.add_argument("--shard", type=int, help="run only this shard (0-based), for multi-node runs")
+    shard.add_argument("--seed", type=int, help="shared seed, required with --shard")
+    shard.add_argument("--spectrum-bins", type=int, default=0, help="record the electron spectra in this many log bins")
+    shard.add_argument("--workers", type=int, help="local processes (default: one per CPU)")
+    shard.add_argument("--threads", type=int, help="numba threads per process (default: 1 per local process, all cores with --shard)")
+    shard.add_argument("--output", type=Path, help="results folder (default: a new timestamped folder)")
+
+    merge = commands.add_parser("merge", help="combine shard folders into one results folder")
+    merge.add_argument("shard_dirs", type=Path, nargs="+")
+    merge.add_argument("--output", type=Path, help="results folder (default: the shards' parent folder)")
+    merge.add_argument("--format", choices=["csv", "npy"], help="standard mode output format (default: the shards')")
+
+    resume = commands.add_parser("resume", help="continue an interrupted run from its checkpoint")
+    resume.add_argument("results_dir", type=Path)
+
+    sensitivity = commands.add_parser("sensitivity", help="response of every channel to scaling each channel's cross section, in one run")
+    sensitivity.add_argument("--energy", type=float, required=True, help="incident energy in eV")
+    sensitivity.add_argument("--cut-off", type=float, required=True, help="cut-off energy in eV")
+    sensitivity.add_argument("--simulations", type=int, required=True)
+    sensitivity.add_argument("--factor", type=float, default=1.10, help="cross section scale factor (default: 1.1)")
+    sensitivity.add_argument("--channels", nargs="+", help="channels to perturb, by code name or index (default: every open channel)")
+    sensitivity.add_argument("--seed", type=int, help="random seed (default: fresh entropy, recorded in the README)")
+    sensitivity.add_argument("--sampler", choices=["analytic", "table", "alias"], default="analytic",
+                             help="event selection (see simulation/sampling.py)")
+    sensitivity.add_argument("--threads", type=int, help="numba threads (default: all cores)")
+    sensitivity.add_argument("--output", type=Path, help="results folder (default: a new timestamped folder)")
+
+    commands.add_parser("warmup", help="compile every kernel into the on-disk cache and report the timings")
+    return parser
+
+def run_parameters(args, incident_energy, cut_off):
+    return {
+        "mode": args.mode,
+        "initial_energy": incident_energy,
+        "cut_off": cut_off,
+        "total_simulations": args.simulations,
+        "seed": resolve_seed(args.seed),
+        "target_rse": args.target_rse if args.mode != "generational" else None,
+        "monitor": parse_channels(args.monitor) if args.monitor and args.mode != "generational" else None,
+        "format": args.format if args.mode == "standard" else None,
+        "sampler": args.sampler,
+        "spectrum_bins": args.spectrum_bins if args.mode != "generational" else 0,
+        "trace_every": args.trace_every,
+    }
+
+def sweep_energies(args):
+    energies = list(args.energies)
+    if args.energy_range is not None:
+        start, stop, points = args.energy_range
+        spacing = np.geomspace if args.spacing == "log" else np.linspace
+        # rounded so log spacing gives 2000.0 rather than 2000.0000000000002 in folder names
+        energies += [float(f"{e:.12g}") for e in spacing(start, stop, int(points))]
+    if not energies:
+        sys.exit("mrie sweep: give --energies and/or --energy-range")
+    return energies
+
+def sweep_point(incident_energy, cut_off):
+    if 0 < cut_off < incident_energy:
+        return True
+    print(f"Skipping {incident_energy} eV with cut-off {cut_off} eV (cut-off must be below the incident energy)")
+    return False
+
+def summary_sweep(args, energies, cut_off):
+    if not energies:
+        return []
+    seed = resolve_seed(args.seed)
+    count, mean, m2, diagnostics = run_multi_energy_simulations(energies, args.simulations, cut_off,
+                                                                sampler=args.sampler, seed=seed)
+    points = []
+    for k, incident_energy in enumerate(energies):
+        output = create_results_folder(incident_energy, args.simulations, cut_off, parent=args.output)
+        total = diagnostics["total"][k]
+        write_summary_csv(output, count[k], mean[k], m2[k], total, code_names)
+        write_species_summary(output, incident_energy, count[k], mean[k], m2[k], total)
+        write_deposition_csv(output, diagnostics["deposition"][k], count[k], incident_energy, code_names)
+        write_s_readme(output, incident_energy, cut_off, count[k], total[28], total[29],
+                       {"seed": seed, "stack_growths": int(diagnostics["stack_growths"][k]),
+                        "energy_residual": float(diagnostics["energy_residual"][k]),
+                        "energy_conserved": bool(diagnostics["energy_conserved"][k])},
+                       title="Summary Simulation Results")
+        points.append((incident_energy, cut_off, args.simulations, seed, output.name))
+    return points
+
+def run_command(args):
+    if getattr(args, "threads", None) is not None:
+        set_num_threads(args.threads)
+    if getattr(args, "monitor", None):
+        if args.target_rse is None:
+            sys.exit(f"mrie {args.command}: --monitor only applies with --target-rse")
+        try:
+            monitored_columns(parse_channels(args.monitor), np.inf)
+        except ValueError as error:
+            sys.exit(f"mrie {args.command}: {error}")
+
+    if args.command == "run":
+        if not 0 < args.cut_off < args.energy:
+            sys.exit("mrie run: --cut-off must be greater than 0 and less than --energy")
+        output = args.output or create_results_folder(args.energy, args.simulations, args.cut_off,
+                                                      generational=args.mode == "generational")
+        output.mkdir(parents=True, exist_ok=True)
+        print(f"Results written to {run_and_write(output, run_parameters(args, args.energy, args.cut_off))}")
+        return
+
+    if args.command == "sweep":
+        points = []
+        energies = sweep_energies(args)
+        if (args.mode == "summary" and args.sampler == "analytic" and args.target_rse is None
+                and not args.spectrum_bins and not args.trace_every):
+            for cut_off in args.cut_offs:
+                points += summary_sweep(args, [e for e in energies if sweep_point(e, cut_off)], cut_off)
+            energies = []
+        for incident_energy in energies:
+            for cut_off in args.cut_offs:
+                if not sweep_point(incident_energy, cut_off):
+                    continue
+                run = run_parameters(args, incident_energy, cut_off)
+                output = create_results_folder(incident_energy, args.simulations, cut_off,
+                                               generational=args.mode == "generational", parent=args.output)
+                run_and_write(output, run)
+                points.append((incident_energy, cut_off, args.simulations, run["seed"], output.name))
+        sweep_dir = args.output or Path.cwd()
+        write_sweep_index(sweep_dir, points)
+        print(f"{len(points)} runs written, listed in {Path(sweep_dir) / 'sweep.csv'}")
+        return
+
+    if args.command == "sensitivity":
+        if not 0 < args.cut_off < args.energy:
+            sys.exit("mrie sensitivity: --cut-off must be greater than 0 and less than --energy")
+        if args.factor <= 0 or args.factor == 1:
+            sys.exit("mrie sensitivity: --factor must be positive and different from 1")
+        try:
+            channels = sensitivity_channels(None if args.channels is None else parse_channels(args.channels), args.energy)
+        except ValueError as error:
+            sys.exit(f"mrie sensitivity: {error}")
+        output = args.output or create_results_folder(args.energy, args.simulations, args.cut_off)
+        output.mkdir(parents=True, exist_ok=True)
+        count, mean, m2, channels, diagnostics = run_sensitivity_simulations(
+            args.energy, args.simulations, args.cut_off, factor=args.factor, channels=channels,
+            sampler=args.sampler, seed=args.seed)
+        response, error = sensitivity_matrix(count, mean, m2, channels, args.factor)
+        total = diagnostics["total"]
+        write_summary_csv(output, count, mean[0], m2[0], total, code_names)
+        write_sensitivity_csv(output, response, error, code_names)
+        write_s_readme(output, args.energy, args.cut_off, count, total[28], total[29],
+                       diagnostics, title="Sensitivity Analysis Results")
+        print(f"Results written to {output}")
+        return
+
+    if args.command == "warmup":
+        total = 0.0
+        for kernel, sampler, seconds in warmup() + warmup_sensitivity() + warmup_traces():
+            print(f"{kernel:<34} {sampler:<9} {seconds:8.2f} s")
+            total += seconds
+        print(f"{'total':<44} {total:8.2f} s (run again: the cached kernels only need to load)")
+        return
+
+    if args.command == "resume":
+        state, run = load_checkpoint(args.results_dir)
+        if state is None:
+            sys.exit(f"mrie resume: no checkpoint.npz in {args.results_dir}")
+        print(f"Resuming after {state['completed']} of {run['total_simulations']} simulations")
+        print(f"Results written to {run_and_write(args.results_dir, run, resume=state)}")
+        return
+
+    if args.command == "merge":
+        output = args.output or args.shard_dirs[0].parent
+        print(f"Merged results written to {merge_shards(args.shard_dirs, output, args.format)}")
+        return
+
+    if args.shard is not None and args.seed is None:
+        sys.exit("mrie shard: --seed is required with --shard so every node draws from the same run")
+    output = args.output or create_results_folder(args.energy, args.simulations, args.cut_off,
+                                                  generational=args.mode == "generational")
+    if args.shard is None:
+        run_sharded(output, args.mode, args.energy, args.simulations, args.cut_off, args.shards,
+                    seed=args.seed, workers=args.workers, threads=args.threads or 1, output_format=args.format,
+                    spectrum_bins=args.spectrum_bins)
+        print(f"Merged results written to {output}")
+    else:
+        shard_dir = run_shard(output, args.mode, args.energy, args.simulations, args.cut_off, args.shard,
+                              args.shards, args.seed, output_format=args.format, spectrum_bins=args.spectrum_bins)
+        print(f"Shard written to {shard_dir}")
+    return
 
 def main():
+    if len(sys.argv) > 1:
+        return run_command(build_parser().parse_args())
+
     print("Monte Carlo Methane Radiolysis Simulation\n")
     incident_energy = get_valid_input("incident energy in eV", type_func=float)
     cut_off = get_valid_input("cut-off energy in eV", max_value=incident_energy, type_func=float)
     total_simulations = get_valid_input("total simulations", type_func=int)
     request_type = get_gen_input()
 
-    if request_type == 1:
-        data, t_e, e_a = run_simulations(incident_energy, total_simulations, cut_off)
-        results = create_results_folder(incident_energy, total_simulations, cut_off)
-        write_s_csv(results, data, code_names, t_e, e_a)
-        write_s_readme(results, incident_energy, cut_off, total_simulations, t_e, e_a)
-    else:
-        data, t_e, e_a = run_generation_simulations(incident_energy, total_simulations, cut_off)
-        results = create_results_folder(incident_energy, total_simulations, cut_off, generational=True)
-        write_g_csv(results, data, code_names)
-        write_g_readme(results, incident_energy, cut_off, total_simulations, t_e, e_a)
+    target_rse = get_target_input() if request_type != 2 else None
+    monitor = get_monitor_input(incident_energy) if target_rse is not None else None
+    seed = get_seed_input()
+    output_format = get_format_input() if request_type == 1 else None
 
+    run = {
+        "mode": data_types[request_type],
+        "initial_energy": incident_energy,
+        "cut_off": cut_off,
+        "total_simulations": total_simulations,
+        "seed": resolve_seed(seed),
+        "target_rse": target_rse,
+        "monitor": monitor,
+        "format": output_format,
+        "sampler": "analytic",
+    }
+    results = create_results_folder(incident_energy, total_simulations, cut_off, generational=request_type == 2)
+    run_and_write(results, run)
     return
 
 
@@ -1,7 +1,10 @@
+import os
+import json
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import date
-from monte_carlo_sim.simulation.constants import event_dict
+from monte_carlo_sim.simulation.constants import event_dict, delta_k
 
 """
 Methane Radiolysis Simulation - Data Export Module
@@ -12,9 +15,46 @@ CSV formats and generate descriptive README metadata for both standard
 and generational Monte Carlo simulation runs.
 
 Functions:
-    - create_results_folder: Generates a timestamped directory for outputs.
+    - create_results_folder: Generates a timestamped directory for outputs (in cwd or parent).
+    - write_sweep_index: Lists the points of a parameter sweep and their results folders in sweep.csv.
     - write_s_csv/readme: Handles standard (per-simulation) data export.
+    - open_s_csv/append_s_csv: Write the standard CSV header once, then append chunks of rows.
+    - stream_s_csv: Returns a sink for run_simulations that appends each chunk as it completes.
+      With resume_from=n the existing results.csv is cut back to its first n rows and appended to.
+    - write_s_npy/stream_s_npy: Binary standard export, one .npy file per column group
+      (counts.npy, terminating_energy.npy, attachment_energy.npy) plus a results.json sidecar.
+      Counts use the smallest unsigned dtype that provably fits (see count_dtype).
+    - finalize_s_npy: Records the number of histories actually written when a run stopped early
+      (the .npy files keep their preallocated length, the sidecar count is authoritative).
+    - load_s_results: Reads a standard results folder back (memory-mapped for .npy, parsed for CSV).
+    - read_s_chunks: Yields a standard results folder chunk_size rows at a time (memmap slices for
+      .npy, pd.read_csv(chunksize=...) for CSV), so copying rows never holds a whole folder.
+    - write_summary_csv: Per-channel mean, variance, standard error and 95% confidence interval
+      from the running moments of a summary run (no per-history rows), and the exact column sums.
+    - write_deposition_csv: Energy deposited per channel, below the cut-off and by attachment
+      (deposition.csv), with the mean per simulation and the fraction of the input energy.
+    - write_spectra_csv: Log-binned electron spectra (spectra.csv): collisions and ejected secondary
+      electrons per energy bin, per simulation and eV, and the degradation spectrum.
+    - write_species_csv: Species yields of a standard or summary run (species.csv): mean per
+      simulation, its standard error (an upper bound for summary runs, labelled as such), total and
+      G-value (molecules per 100 eV absorbed). See simulation/species.py.
+    - write_g_species_csv: Species totals per generation of a generational run (species.csv).
+    - write_sensitivity_csv: Writes the relative sensitivity matrix of a sensitivity analysis
+      (sensitivity.csv, one row per perturbed channel, one column per quantity) and its standard
+      errors (sensitivity_error.csv) in the same layout.
+    - open_trace/append_trace: Event trace file (trace.bin), fixed-width packed records of
+      trace_dtype (uint8 event, float32 pre-collision energy, uint8 generation; 6 bytes each)
+      appended a buffer at a time. See simulation/trace.py.
+    - write_trace_index/load_trace: trace_index.npy (history, offset, records per traced history,
+      offsets in records) plus a trace.json sidecar; load_trace memory-maps trace.bin and returns
+      the records, the index and the sidecar, so history h is records[offset:offset + records].
     - write_g_csv/readme: Handles generational (binned by event tier) data export.
+    - generation_label: Names generation rows, numbering them past the tenth.
+    - save_checkpoint/load_checkpoint/clear_checkpoint: Persist the chunk loop state of a run
+      (see run_simulation.py CHECKPOINTS) together with the run's parameters in checkpoint.npz.
+      The file is replaced atomically, so an interruption leaves the previous checkpoint intact.
+    - write_diagnostics: Appends run diagnostics (random seed, electron stack growths, energy balance)
+      to a README.
 """
 
 
@@ -31,42 +71,188 @@ generation_names = [
     "Denary",
 ]
 
-def create_results_folder(initial_energy, simulations, cut_off, generational=False):
+def generation_label(generation):
+    if generation < len(generation_names):
+        return generation_names[generation]
+    return f"Generation {generation + 1}"
+
+def create_results_folder(initial_energy, simulations, cut_off, generational=False, parent=None):
     today = date.today().strftime("%Y-%m-%d")
     initial_energy_kev = initial_energy / 1000
     folder_name = f"results_{today}_{initial_energy_kev}keV_{simulations}_{cut_off}"
     if generational:
         folder_name += "_generational"
-    results_dir = Path.cwd() / folder_name
-    results_dir.mkdir(exist_ok=True)
+    results_dir = (Path(parent) if parent is not None else Path.cwd()) / folder_name
+    results_dir.mkdir(parents=True, exist_ok=True)
     return results_dir
 
-def write_s_csv(results_dir, data, event_names, terminating_energy, electron_attachment):
-    today = date.today().strftime("%Y-%m-%d")
+def write_sweep_index(sweep_dir, points):
+    df = pd.DataFrame(points, columns=["Initial Energy", "Cut Off", "Simulations", "Seed", "Results"])
+    df.to_csv(Path(sweep_dir) / "sweep.csv", index=False)
+    return
+
+def s_csv_columns(event_names):
+    return ["Simulation"] + event_names + ["Terminating Energy", "Electron Energy Captured"]
+
+def open_s_csv(results_dir, event_names):
     filename = f"results.csv"
+    pd.DataFrame(columns=s_csv_columns(event_names)).to_csv(results_dir / filename, index=False)
+    return results_dir / filename
+
+def append_s_csv(path, data, event_names, terminating_energy, electron_attachment, first_simulation=0):
     df = pd.DataFrame(data, columns=event_names)
     df["Terminating Energy"] = terminating_energy
     df["Electron Energy Captured"] = electron_attachment
-    df["Simulation"] = "#" + (df.index + 1).astype(str) + " Simulation"
+    numbers = np.arange(first_simulation + 1, first_simulation + len(df) + 1).astype(str)
+    df["Simulation"] = "#" + pd.Series(numbers) + " Simulation"
 
-    df = df[
-        ["Simulation"] + event_names +
-        ["Terminating Energy", "Electron Energy Captured"]
-    ]
+    df = df[s_csv_columns(event_names)]
 
-    df.to_csv(results_dir / filename, index=False)
+    df.to_csv(path, mode="a", header=False, index=False)
     return
 
+def write_s_csv(results_dir, data, event_names, terminating_energy, electron_attachment):
+    path = open_s_csv(results_dir, event_names)
+    append_s_csv(path, data, event_names, terminating_energy, electron_attachment)
+    return
+
+def truncate_s_csv(path, rows):
+    with open(path, "r+b") as f:
+        for _ in range(rows + 1):
+            if not f.readline():
+                raise ValueError(f"{path} holds fewer than the {rows} rows recorded in the checkpoint")
+        f.truncate(f.tell())
+    return path
+
+def stream_s_csv(results_dir, event_names, resume_from=None):
+    if resume_from is None:
+        path = open_s_csv(results_dir, event_names)
+    else:
+        path = truncate_s_csv(results_dir / "results.csv", resume_from)
+
+    def sink(data, terminating_energy, electron_attachment, first_simulation):
+        append_s_csv(path, data, event_names, terminating_energy, electron_attachment, first_simulation)
+
+    return sink
+
+def count_dtype(initial_energy):
+    # every event removes at least min(delta_k) eV from the history's energy budget
+    max_events = initial_energy / delta_k.min()
+    for dtype in (np.uint16, np.uint32):
+        if max_events <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+def open_s_npy(results_dir, event_names, simulations, initial_energy, cut_off):
+    dtype = count_dtype(initial_energy)
+    counts = np.lib.format.open_memmap(results_dir / "counts.npy", mode="w+", dtype=dtype,
+                                       shape=(simulations, len(event_names)))
+    terminating_energy = np.lib.format.open_memmap(results_dir / "terminating_energy.npy", mode="w+",
+                                                   dtype=np.float64, shape=(simulations,))
+    electron_attachment = np.lib.format.open_memmap(results_dir / "attachment_energy.npy", mode="w+",
+                                                    dtype=np.float64, shape=(simulations,))
+    metadata = {
+        "format": "npy",
+        "initial_energy": initial_energy,
+        "cut_off": cut_off,
+        "simulations": simulations,
+        "columns": list(event_names),
+        "count_dtype": dtype.name,
+        "files": {
+            "counts": "counts.npy",
+            "terminating_energy": "terminating_energy.npy",
+            "attachment_energy": "attachment_energy.npy",
+        },
+    }
+    with open(results_dir / "results.json", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    return counts, terminating_energy, electron_attachment
+
+def append_s_npy(arrays, data, terminating_energy, electron_attachment, first_simulation=0):
+    counts, terminating_total, attachment_total = arrays
+    n = len(data)
+    counts[first_simulation:first_simulation + n] = data
+    terminating_total[first_simulation:first_simulation + n] = terminating_energy
+    attachment_total[first_simulation:first_simulation + n] = electron_attachment
+    for array in arrays:
+        array.flush()
+    return
+
+def write_s_npy(results_dir, data, event_names, terminating_energy, electron_attachment, initial_energy, cut_off):
+    arrays = open_s_npy(results_dir, event_names, len(data), initial_energy, cut_off)
+    append_s_npy(arrays, data, terminating_energy, electron_attachment)
+    return
+
+def reopen_s_npy(results_dir):
+    return tuple(np.load(results_dir / name, mmap_mode="r+")
+                 for name in ("counts.npy", "terminating_energy.npy", "attachment_energy.npy"))
+
+def stream_s_npy(results_dir, event_names, simulations, initial_energy, cut_off, resume=False):
+    if resume:
+        arrays = reopen_s_npy(results_dir)
+    else:
+        arrays = open_s_npy(results_dir, event_names, simulations, initial_energy, cut_off)
+
+    def sink(data, terminating_energy, electron_attachment, first_simulation):
+        append_s_npy(arrays, data, terminating_energy, electron_attachment, first_simulation)
+
+    return sink
+
+def finalize_s_npy(results_dir, simulations):
+    with open(results_dir / "results.json", encoding="utf-8") as f:
+        metadata = json.load(f)
+    metadata["simulations"] = simulations
+    with open(results_dir / "results.json", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    return
+
+def load_s_results(results_dir, mmap_mode="r"):
+    results_dir = Path(results_dir)
+    sidecar = results_dir / "results.json"
+    if sidecar.exists():
+        with open(sidecar, encoding="utf-8") as f:
+            metadata = json.load(f)
+        files = metadata["files"]
+        counts = np.load(results_dir / files["counts"], mmap_mode=mmap_mode)
+        terminating_energy = np.load(results_dir / files["terminating_energy"], mmap_mode=mmap_mode)
+        electron_attachment = np.load(results_dir / files["attachment_energy"], mmap_mode=mmap_mode)
+        n = metadata["simulations"]
+        return counts[:n], terminating_energy[:n], electron_attachment[:n], metadata
+
+    df = pd.read_csv(results_dir / "results.csv", float_precision="round_trip")
+    columns = list(df.columns[1:-2])
+    metadata = {"format": "csv", "simulations": len(df), "columns": columns}
+    return (df[columns].to_numpy(), df["Terminating Energy"].to_numpy(),
+            df["Electron Energy Captured"].to_numpy(), metadata)
+
+
+def read_s_chunks(results_dir, chunk_size=100_000):
+    results_dir = Path(results_dir)
+    if (results_dir / "results.json").exists():
+        counts, terminating_energy, electron_attachment, _ = load_s_results(results_dir)
+        for start in range(0, len(counts), chunk_size):
+            end = start + chunk_size
+            yield start, counts[start:end], terminating_energy[start:end], electron_attachment[start:end]
+        return
+
+    start = 0
+    for df in pd.read_csv(results_dir / "results.csv", float_precision="round_trip", chunksize=chunk_size):
+        columns = list(df.columns[1:-2])
+        yield (start, df[columns].to_numpy(), df["Terminating Energy"].to_numpy(),
+               df["Electron Energy Captured"].to_numpy())
+        start += len(df)
+
 
 def write_s_readme(results_dir,initial_energy, cut_off, simulations,
-                   terminating_energy, electron_attachment):
+                   terminating_energy, electron_attachment, diagnostics=None,
+                   title="Standard Simulation Results"):
     try:
-        terminating_energy = terminating_energy.sum()
-        electron_attachment = electron_attachment.sum()
+        terminating_energy = np.sum(terminating_energy)
+        electron_attachment = np.sum(electron_attachment)
         filename = f"README.txt"
 
         with open(results_dir / filename, "w", encoding="utf-8") as f:
-            f.write("# Standard Simulation Results\n\n")
+            f.write(f"# {title}\n\n")
             f.write("## Event Definition\n")
             for code_name, event_name in event_dict.items():
                 f.write(f"{event_name}:({code_name})\n")
@@ -83,6 +269,7 @@ def write_s_readme(results_dir,initial_energy, cut_off, simulations,
                 "(bond energy + excess kinetic energy): "
                 f"{electron_attachment} eV\n"
             )
+            write_diagnostics(f, diagnostics)
 
         return
 
@@ -92,11 +279,170 @@ def write_s_readme(results_dir,initial_energy, cut_off, simulations,
     except Exception as e:
         raise RuntimeError("Failed to write README file") from e
 
+def write_summary_csv(results_dir, count, mean, m2, total, event_names):
+    filename = f"results.csv"
+    variance = m2 / (count - 1) if count > 1 else np.full_like(m2, np.nan)
+    std_error = np.sqrt(variance / count)
+    df = pd.DataFrame({
+        "Quantity": list(event_names) + ["Terminating Energy", "Electron Energy Captured"],
+        "Mean": mean,
+        "Variance": variance,
+        "Standard Error": std_error,
+        "CI95 Lower": mean - 1.96 * std_error,
+        "CI95 Upper": mean + 1.96 * std_error,
+        "Total": total,
+    })
+    df.to_csv(results_dir / filename, index=False)
+    return
+
+def write_deposition_csv(results_dir, deposition, simulations, initial_energy, event_names):
+    filename = f"deposition.csv"
+    quantities = list(event_names) + ["Terminating Energy", "Electron Energy Captured"]
+    df = pd.DataFrame({
+        "Quantity": quantities + ["Total"],
+        "Energy Deposited (eV)": np.append(deposition, deposition.sum()),
+        "Mean per Simulation (eV)": np.append(deposition, deposition.sum()) / simulations,
+        "Fraction of Input": np.append(deposition, deposition.sum()) / (initial_energy * simulations),
+    })
+    df.to_csv(results_dir / filename, index=False)
+    return
+
+def write_spectra_csv(results_dir, edges, spectra, degradation, simulations):
+    filename = f"spectra.csv"
+    width = np.diff(edges)
+    df = pd.DataFrame({
+        "Lower Edge (eV)": edges[:-1],
+        "Upper Edge (eV)": edges[1:],
+        "Collisions": spectra[0],
+        "Secondary Electrons": spectra[1],
+        "Collisions per Simulation per eV": spectra[0] / (simulations * width),
+        "Secondary Electrons per Simulation per eV": spectra[1] / (simulations * width),
+        "Degradation Spectrum (cm^-2 eV^-1)": degradation,
+    })
+    df.to_csv(results_dir / filename, index=False)
+    return
+
+def write_species_csv(results_dir, species_names, mean, std_error, total, g_value, g_error, error="Standard Error"):
+    filename = f"species.csv"
+    df = pd.DataFrame({
+        "Species": species_names,
+        "Mean": mean,
+        error: std_error,
+        "Total": total,
+        "G-value (per 100 eV)": g_value,
+        f"G-value {error}": g_error,
+    })
+    df.to_csv(results_dir / filename, index=False)
+    return
+
+def write_g_species_csv(results_dir, data, species_names):
+    filename = f"species.csv"
+    df = pd.DataFrame(data, columns=species_names)
+    df.insert(0, "Generation", [generation_label(g) for g in range(len(df))])
+    df.to_csv(results_dir / filename, index=False)
+    return
+
+def write_sensitivity_csv(results_dir, response, error, event_names):
+    columns = list(event_names) + ["Terminating Energy", "Electron Energy Captured"]
+    for filename, values in [("sensitivity.csv", response), ("sensitivity_error.csv", error)]:
+        df = pd.DataFrame(values, columns=columns)
+        df.insert(0, "Perturbed Channel", event_names)
+        df.to_csv(results_dir / filename, index=False)
+    return
+
+
+trace_dtype = np.dtype([("event", np.uint8), ("energy", np.float32), ("generation", np.uint8)])
+trace_index_dtype = np.dtype([("history", np.int64), ("offset", np.int64), ("records", np.int64)])
+
+def open_trace(results_dir):
+    path = results_dir / "trace.bin"
+    open(path, "wb").close()
+    return path
+
+def append_trace(path, events, energies, generations):
+    records = np.empty(len(events), dtype=trace_dtype)
+    records["event"] = events
+    records["energy"] = energies
+    records["generation"] = generations
+    with open(path, "ab") as f:
+        records.tofile(f)
+    return
+
+def write_trace_index(results_dir, index, metadata):
+    np.save(results_dir / "trace_index.npy", np.sort(index, order="history"))
+    metadata = dict(metadata, format="trace", file="trace.bin", index="trace_index.npy",
+                    record=[[name, trace_dtype[name].str] for name in trace_dtype.names])
+    with open(results_dir / "trace.json", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    return
+
+def load_trace(results_dir):
+    results_dir = Path(results_dir)
+    with open(results_dir / "trace.json", encoding="utf-8") as f:
+        metadata = json.load(f)
+    index = np.load(results_dir / metadata["index"])
+    path = results_dir / metadata["file"]
+    if path.stat().st_size == 0:
+        return np.empty(0, dtype=trace_dtype), index, metadata
+    return np.memmap(path, dtype=trace_dtype, mode="r"), index, metadata
+
+
+def save_checkpoint(results_dir, state, run):
+    arrays = {key: np.asarray(value) for key, value in state.items()}
+    arrays["run"] = np.array(json.dumps(run))
+    partial = results_dir / "checkpoint.partial.npz"
+    with open(partial, "wb") as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, results_dir / "checkpoint.npz")
+    return
+
+def load_checkpoint(results_dir):
+    path = Path(results_dir) / "checkpoint.npz"
+    if not path.exists():
+        return None, None
+    with np.load(path) as data:
+        state = {key: data[key].item() if data[key].ndim == 0 else data[key]
+                 for key in data.files if key != "run"}
+        run = json.loads(data["run"].item())
+    return state, run
+
+def clear_checkpoint(results_dir):
+    path = Path(results_dir) / "checkpoint.npz"
+    if path.exists():
+        path.unlink()
+    return
+
+def write_diagnostics(f, diagnostics):
+    if not diagnostics:
+        return
+    f.write("\n## Diagnostics\n")
+    if "seed" in diagnostics:
+        f.write(f"- Random Seed: {diagnostics['seed']}\n")
+    if "factor" in diagnostics:
+        f.write(f"- Cross Section Factor: {diagnostics['factor']} (each perturbed channel scaled by this factor)\n")
+    if "shards" in diagnostics:
+        f.write(f"- Merged From Shards: {diagnostics['shards']}\n")
+    if "stack_growths" in diagnostics:
+        f.write(f"- Electron Stack Growths (expected 0): {diagnostics['stack_growths']}\n")
+    if diagnostics.get("first_chunk_seconds") is not None:
+        f.write(f"- Wall Time: {diagnostics['seconds']:.2f} s (first chunk, including JIT compile or cache load: "
+                f"{diagnostics['first_chunk_seconds']:.2f} s)\n")
+    if "energy_residual" in diagnostics:
+        status = "conserved" if diagnostics["energy_conserved"] else "NOT CONSERVED"
+        f.write(f"- Energy Balance: {status} (largest per-simulation imbalance {diagnostics['energy_residual']:.3e} eV)\n")
+    if "target_rse" in diagnostics:
+        status = "converged" if diagnostics["converged"] else "not converged"
+        f.write(f"- Target Relative Standard Error: {diagnostics['target_rse']} ({status} after {diagnostics['simulations']} simulations)\n")
+        f.write(f"- Largest Relative Standard Error: {diagnostics['max_rse']:.3e} ({diagnostics['slowest_column']})\n")
+    return
+
 def write_g_csv(results_dir, data, event_names):
     filename = f"results.csv"
     df = pd.DataFrame(data, columns=event_names)
 
-    df["Generation"] = generation_names
+    df["Generation"] = [generation_label(g) for g in range(len(df))]
 
     df = df[
         ["Generation"] + event_names
@@ -106,7 +452,7 @@ def write_g_csv(results_dir, data, event_names):
     return
 
 def write_g_readme(results_dir,initial_energy, cut_off, simulations,
-                   terminating_energy, electron_attachment):
+                   terminating_energy, electron_attachment, diagnostics=None):
 
     try:
         filename = f"README.txt"
@@ -129,6 +475,7 @@ def write_g_readme(results_dir,initial_energy, cut_off, simulations,
                 "(bond energy + excess kinetic energy): "
                 f"{electron_attachment} eV\n"
             )
+            write_diagnostics(f, diagnostics)
 
         return
 
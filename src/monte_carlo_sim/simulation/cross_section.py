@@ -7,6 +7,7 @@ from monte_carlo_sim.events.eie import range_eie_1, range_eie_2, range_eie_3, pa
 from monte_carlo_sim.events.electron_attachment import params_ea, range_ea, offset_ea, slope_ea
 from monte_carlo_sim.events.photon_emission import params_pho, slope_pho, offset_pho
 from monte_carlo_sim.simulation.constants import E_R, sigma_0, min_energy_ion, delta_k
+from monte_carlo_sim.simulation.rng import rng_uniform
 
 """
 Cross Section Calculation and Event Selection for Methane Electron-Impact Processes
@@ -20,10 +21,13 @@ find_range(eV, r):
   - Determines which energy range bracket contains the given electron energy
   - Returns range index for piecewise polynomial evaluation
   - Returns -1 for energies above highest range (power law tail region)
+  - A linear scan: the fits have at most 5 range edges, and np.searchsorted made every
+    collision of the analytic sampler about 50% slower
 
 ME_cs(eV, index, params, range, offset, slope):
   - Molecular Excitation and Electron Impact Excitation cross section calculator
   - Used for: vibrational modes, rotational transitions, EIE, and electron attachment
+  - Reference for one channel; cross_section_fill evaluates all of them with me_fill
 
 
 photon_cs(eV, index, params, offset, slope):
@@ -36,23 +40,68 @@ ion_cs(eV, index, params, offset, slope):
   - Enforces physical threshold: E_physical_th = max(2*min_energy + delta_k, E_th*1000)
 
 
-cross_section_calc(eV, manipulated=-1):
+FUSED PIECEWISE TABLE:
+The 10 piecewise channels (EIE 7-9, attachment 10, vibrational 11-14, rotational 15-16) share one
+sorted array of every range edge, me_breaks. Each channel's own range index is constant between
+two consecutive global edges, so a single lookup per collision selects, for every channel at once,
+whether it is closed, which polynomial applies or whether it is on its power law tail.
+
+me_channels: (params, range, offset, slope, index) of the 10 channels, in cross section order
+
+build_me_table():
+  - Returns me_breaks (m,), me_kind (m + 1, 10) (ME_CLOSED, ME_POLYNOMIAL or ME_TAIL per segment and
+    channel), me_coeffs (m + 1, 10, 5) (a0-a4, contiguous per segment) and me_tail (10, 2) (slope,
+    offset); segment s covers me_breaks[s - 1] <= eV < me_breaks[s]
+  - Built once at import from the events/ parameters, with find_range, so it reproduces ME_cs exactly
+
+me_segment(eV): binary search for the segment, the number of edges <= eV
+
+me_fill(eV, cross_sections):
+  - Writes channels 7-16; eV**2, eV**3, eV**4 and log(eV) are computed once per collision (and only
+    below the last polynomial edge / from the first power law edge) instead of once per channel
+  - Bit-identical to calling ME_cs for every channel
+
+cross_section_fill(eV, cross_sections, manipulated=-1, factor=1.10):
+  - Writes the 28 absolute cross sections into a caller-owned buffer and returns their sum
+  - Allocation free, so the simulation kernels can reuse one scratch buffer per history
+
+cross_section_calc(eV, manipulated=-1, factor=1.10):
   - Computes all 28 normalized cross sections for given electron energy
   - Cross sections indexed as: [0-6] ionization, [7-9] EIE, [10] attachment, 
     [11-14] vibrational, [15-16] rotational, [17-27] photon emission
-  - Optional manipulation: increases specified event cross section by 10% for sensitivity analysis
+  - Optional manipulation: multiplies the specified event cross section by factor (default +10%)
+    for sensitivity analysis
   - Returns probability distribution (normalized cross sections summing to 1)
 
-select_event(eV, manipulated=-1):
+cross_sections(energies, normalized=False, manipulated=-1, factor=1.10):
+  - All 28 cross sections for an array of energies of any shape, returned with a trailing axis
+    of 28 (absolute in cm², or normalized per energy like cross_section_calc)
+  - Evaluated in parallel by cross_sections_fill(energies, table, totals, manipulated, factor),
+    one cross_section_fill per energy, so every row is bit-identical to the scalar functions
+  - Rows where every channel is closed stay 0 when normalized
+  - Used to build the sampling tables, check their error and for plotting or tabulating the fits
+
+select_event(eV, manipulated=-1, factor=1.10):
   - Monte Carlo event selector using cross section probabilities
   - Generates random number and performs cumulative probability lookup
   - Returns event index (0-27) for the selected collision process
   - Returns -1 if no event selected (should not occur with proper normalization)
+  - Draws from the global np.random state; the simulation kernels use select_event_scratch instead
+
+select_event_scratch(eV, scratch, state, manipulated=-1, factor=1.10):
+  - Same distribution as select_event without any per-collision allocation
+  - Draws from the history's own stream (state, see rng.py) so results follow from the seed
+  - Scales the random number by the total instead of normalizing, and stops the
+    cumulative scan at the first channel whose running sum passes the target
+
+channel_thresholds():
+  - Lowest energy (eV) at which each of the 28 cross sections is non-zero
+  - Every channel stays open above its threshold (power law tails), stored as E_threshold
 
 All functions JIT-compiled with Numba for performance. Energies in eV, cross sections in cm².
 """
 
-@njit
+@njit(cache=True)
 def find_range(eV, r):
     if eV >= r[-1]:
         return len(r) -1
@@ -61,7 +110,7 @@ def find_range(eV, r):
             return i
     return -1
 
-@njit
+@njit(cache=True)
 def ME_cs(eV, index, params, range, offset, slope):
     range_index = find_range(eV, range)
     if range_index == -1:
@@ -78,7 +127,7 @@ def ME_cs(eV, index, params, range, offset, slope):
         a4 = params[4][index][range_index]
         return a4 * (eV**4) + a3 * (eV**3) + a2 * (eV**2) + a1 * (eV) + a0
 
-@njit
+@njit(cache=True)
 def photon_cs(eV, index, params, offset, slope):
     E_th = params[8][index]
     E_max = params[9][index]
@@ -111,7 +160,7 @@ def photon_cs(eV, index, params, offset, slope):
         return math.exp(slope * math.log(eV) + offset)
 
 
-@njit
+@njit(cache=True)
 def ion_cs(eV, index, params, offset, slope):
     E_th = params[6][index]
     E_max = params[7][index]
@@ -137,29 +186,107 @@ def ion_cs(eV, index, params, offset, slope):
             return math.exp(slope * math.log(eV) + offset)
 
 
-@njit
-def cross_section_calc(eV, manipulated=-1):
-    cross_sections = np.empty(28, dtype=np.float64)
+me_channels = [(params_eie_1, range_eie_1, offset_eie_1, slope_eie_1, 0),
+               (params_eie_2, range_eie_2, offset_eie_2, slope_eie_2, 0),
+               (params_eie_3, range_eie_3, offset_eie_3, slope_eie_3, 0),
+               (params_ea, range_ea, offset_ea, slope_ea, 0)]
+me_channels += [(params_nu, range_nu, offset_nu, slope_nu, n) for n in range(4)]
+me_channels += [(params_j, range_j, offset_j, slope_j, j) for j in range(2)]
+
+ME_CLOSED = 0
+ME_POLYNOMIAL = 1
+ME_TAIL = 2
+
+def build_me_table():
+    breaks = np.unique(np.concatenate([np.asarray(r, dtype=np.float64) for _, r, _, _, _ in me_channels]))
+    kinds = np.zeros((len(breaks) + 1, len(me_channels)), dtype=np.int64)
+    coeffs = np.zeros((len(breaks) + 1, len(me_channels), 5), dtype=np.float64)
+    tails = np.zeros((len(me_channels), 2), dtype=np.float64)
+    for c, (params, r, offset, slope, index) in enumerate(me_channels):
+        tails[c] = slope[index], offset[index]
+        for s in range(len(breaks) + 1):
+            range_index = find_range(breaks[s - 1] if s > 0 else breaks[0] - 1.0, r)
+            if range_index == -1:
+                kinds[s, c] = ME_CLOSED
+            elif range_index == len(r) - 1:
+                kinds[s, c] = ME_TAIL
+            else:
+                kinds[s, c] = ME_POLYNOMIAL
+                coeffs[s, c] = params[:, index, range_index]
+    return breaks, kinds, coeffs, tails
+
+me_breaks, me_kind, me_coeffs, me_tail = build_me_table()
+me_polynomial_end = max(float(r[-1]) for _, r, _, _, _ in me_channels)
+me_tail_start = min(float(r[-1]) for _, r, _, _, _ in me_channels)
+
+@njit(cache=True)
+def me_segment(eV):
+    lo = 0
+    hi = me_breaks.shape[0]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if me_breaks[mid] <= eV:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+@njit(cache=True)
+def me_fill(eV, cross_sections):
+    s = me_segment(eV)
+    e2 = e3 = e4 = log_eV = 0.0
+    if eV < me_polynomial_end:
+        e2 = eV**2
+        e3 = eV**3
+        e4 = eV**4
+    if eV >= me_tail_start:
+        log_eV = math.log(eV)
+    for c in range(me_kind.shape[1]):
+        kind = me_kind[s, c]
+        if kind == ME_POLYNOMIAL:
+            a = me_coeffs[s, c]
+            cross_sections[7 + c] = a[4] * e4 + a[3] * e3 + a[2] * e2 + a[1] * eV + a[0]
+        elif kind == ME_TAIL:
+            cross_sections[7 + c] = math.exp(me_tail[c, 0] * log_eV + me_tail[c, 1])
+        else:
+            cross_sections[7 + c] = 0.0
+
+
+@njit(cache=True)
+def cross_section_fill(eV, cross_sections, manipulated=-1, factor=1.10):
     for i in prange(7):
         cross_sections[i] = ion_cs(eV, i, params_ion, offset_ion, slope_ion)
-    cross_sections[7] = ME_cs(eV, 0, params_eie_1, range_eie_1, offset_eie_1, slope_eie_1)
-    cross_sections[8] = ME_cs(eV, 0, params_eie_2, range_eie_2, offset_eie_2, slope_eie_2)
-    cross_sections[9] = ME_cs(eV, 0, params_eie_3, range_eie_3, offset_eie_3, slope_eie_3)
-    cross_sections[10] = ME_cs(eV, 0, params_ea, range_ea, offset_ea, slope_ea)
-    for n in prange(4):
-        cross_sections[n+11] = ME_cs(eV, n, params_nu ,range_nu, offset_nu, slope_nu)
-    for j in prange(2):
-        cross_sections[15+j] = ME_cs(eV, j, params_j, range_j, offset_j, slope_j)
+    me_fill(eV, cross_sections)
     for p in prange(11):
         cross_sections[p+17] = photon_cs(eV, p, params_pho, offset_pho, slope_pho)
     if manipulated != -1:
-        cross_sections[manipulated] = cross_sections[manipulated] * 1.10
-    total =cross_sections.sum()
+        cross_sections[manipulated] = cross_sections[manipulated] * factor
+    return cross_sections.sum()
+
+@njit(cache=True)
+def cross_section_calc(eV, manipulated=-1, factor=1.10):
+    cross_sections = np.empty(28, dtype=np.float64)
+    total = cross_section_fill(eV, cross_sections, manipulated, factor)
     return cross_sections/total
 
-@njit
-def select_event(eV, manipulated=-1):
-    probs = cross_section_calc(eV, manipulated)
+@njit(parallel=True, cache=True)
+def cross_sections_fill(energies, table, totals, manipulated=-1, factor=1.10):
+    for k in prange(energies.shape[0]):
+        totals[k] = cross_section_fill(energies[k], table[k], manipulated, factor)
+
+def cross_sections(energies, normalized=False, manipulated=-1, factor=1.10):
+    energies = np.asarray(energies, dtype=np.float64)
+    flat = np.ascontiguousarray(energies.ravel())
+    table = np.empty((flat.shape[0], 28), dtype=np.float64)
+    totals = np.empty(flat.shape[0], dtype=np.float64)
+    cross_sections_fill(flat, table, totals, manipulated, factor)
+    if normalized:
+        np.divide(table, totals[:, None], out=table, where=totals[:, None] > 0)
+    return table.reshape(energies.shape + (28,))
+
+@njit(cache=True)
+def select_event(eV, manipulated=-1, factor=1.10):
+    probs = cross_section_calc(eV, manipulated, factor)
     limits = np.cumsum(probs)
     r = np.random.rand()
     for i, limit in enumerate(limits):
@@ -167,4 +294,32 @@ def select_event(eV, manipulated=-1):
             return i
     return -1
 
+@njit(cache=True)
+def select_event_scratch(eV, scratch, state, manipulated=-1, factor=1.10):
+    total = cross_section_fill(eV, scratch, manipulated, factor)
+    r = rng_uniform(state) * total
+    cumulative = 0.0
+    last = -1
+    for i in range(28):
+        if scratch[i] > 0:
+            cumulative += scratch[i]
+            last = i
+            if r < cumulative:
+                return i
+    return last
+
+
+def channel_thresholds():
+    thresholds = np.zeros(28, dtype=np.float64)
+    for i in range(7):
+        thresholds[i] = max(2 * min_energy_ion + delta_k[i], params_ion[6][i] * 1000)
+    thresholds[7] = range_eie_1[0]
+    thresholds[8] = range_eie_2[0]
+    thresholds[9] = range_eie_3[0]
+    thresholds[10] = range_ea[0]
+    thresholds[11:15] = range_nu[0]
+    thresholds[15:17] = range_j[0]
+    thresholds[17:28] = params_pho[8] * 1000
+    return thresholds
 
+E_threshold = channel_thresholds()
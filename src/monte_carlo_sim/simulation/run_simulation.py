@@ -1,8 +1,12 @@
+import math
+import time
 import numpy as np
 from tqdm import tqdm
-from numba import njit, prange
-from monte_carlo_sim.simulation.cross_section import select_event
-from monte_carlo_sim.simulation.constants import event_names, delta_k, min_energy_ion
+from numba import njit, prange, get_num_threads
+from monte_carlo_sim.simulation.sampling import build_sampler, sample_event
+from monte_carlo_sim.simulation.cross_section import E_threshold, cross_sections
+from monte_carlo_sim.simulation.rng import resolve_seed, history_stream, rng_uniform
+from monte_carlo_sim.simulation.constants import event_names, code_names, delta_k, min_energy_ion
 
 """
 Monte Carlo Simulation Engine
@@ -13,67 +17,141 @@ tracking secondary electron generation, energy degradation, and event statistics
 STACK OPERATIONS:
 stack_push/stack_pop: LIFO stack management for tracking active electrons
 stack_push_gen/stack_pop_gen: Extended stack tracking both energy and generation number
+stack_capacity(eV, min_energy): Upper bound on the stack depth of one history (see STACK DEPTH)
+stack_grow/stack_grow_gen: Amortized doubling, only reachable if that bound is violated
 
 ENERGY PARTITION:
-ion_event(eV, index): 
+ion_event(eV, index, state): 
   - Handles ionization energy partitioning between incident and ejected electrons
   - Uses random sampling from physically-motivated distribution
   - Returns (eV_old, eV_new) for incident and secondary electrons
 
-ion_gen_event(generation, energy, index):
+ion_gen_event(generation, energy, index, state):
   - Extended version tracking generation number for cascade analysis
   - Increments generation for secondary electron
   - Returns (eV_new, gen_new, eV_old)
 
+RANDOM NUMBERS:
+Every history draws from its own stream, rng.history_stream(seed, history), so its result depends only
+on (seed, history), never on chunk_size, threads or first_history (see sharding.py).
+
 SIMULATION FUNCTIONS:
 
-run_sim(eV, manipulated=-1):
-  - Single simulation starting from incident initial electron energy (eV)
-  - Tracks all 28 event types until all electrons fall below min_energy threshold
-  - Handles ionization (produces 2 electrons), excitation (produces 1 electron), and attachment (terminates electron)
-  - Returns: event_count array, terminating_energy (sub-threshold energy below 1.0eV), electron_attachment_energy (energy absorbed with electron attachment)
+run_sim(eV, min_energy=1, manipulated=-1, sampler=0, tables=None, seed=0, history=0, factor=1.10, deposit=None, spectra=None):
+  - Single simulation, tracks all 28 event types until all electrons fall below min_energy
+  - Returns: event_count array, terminating_energy, electron_attachment_energy, stack_growths
 
-run_batch_simulations(eV, storage, manipulated=-1):
-  - Parallelized batch execution using Numba prange
-  - Runs multiple independent cascade simulations
-  - Returns: event counts, terminating energies, attachment energies for entire batch
+run_batch_simulations(eV, storage, min_energy=1, manipulated=-1, sampler=0, tables=None, seed=0, first_history=0, factor=1.10, threads=1, spectrum_bins=0):
+  - Parallelized batch execution, one contiguous block of histories per thread
+  - Returns: event counts, energies, stack growths, (n, 30) energy deposition and spectra
 
-run_simulations(eV, total_sims, manipulated=-1, chunk_size=500):
-  - Interface on terminal with progress tracking
-  - Processes simulations in chunks to manage memory
-  - Aggregates results across all simulations
-  - Optional manipulation parameter for sensitivity analysis (10% cross section increase)
+run_simulations(eV, total_sims, min_energy=1, manipulated=-1, chunk_size=500, sampler="analytic", points_per_decade=100, sink=None, target_rse=None, monitor=None, seed=None, first_history=0, checkpoint=None, checkpoint_interval=60.0, resume=None, factor=1.10, spectrum_bins=0, stoichiometry=None):
+  - Interface on terminal with progress tracking, runs the simulations in chunks
+  - sink streams every chunk out (memory bounded by chunk_size), target_rse stops early (see CONVERGENCE),
+    stoichiometry accumulates diagnostics["species"] = (count, mean, m2, total) chunk by chunk
+  - Returns: event counts, terminating energies, attachment energies and a diagnostics dict
+
+SUMMARY FUNCTIONS:
+
+welford_update(count, mean, m2, values): adds one history (30 summary_columns) to running moments
+merge_welford(count_a, mean_a, m2_a, count_b, mean_b, m2_b): combines two sets of moments (Chan et al.)
+
+run_summary_batch(eV, total_sims, min_energy=1, manipulated=-1, sampler=0, tables=None, seed=0, first_history=0, threads=1, factor=1.10, spectrum_bins=0):
+  - Parallelized batch keeping Welford moments and exact column sums per thread block, merged at the end
+  - Returns: count, mean (30,), m2 (30,), total (30,), stack growths, deposition (30,), largest energy
+    imbalance, spectra
+
+run_summary_simulations(eV, total_sims, min_energy=1, manipulated=-1, chunk_size=500, sampler="analytic", points_per_decade=100, target_rse=None, monitor=None, seed=None, first_history=0, checkpoint=None, checkpoint_interval=60.0, resume=None, factor=1.10, spectrum_bins=0):
+  - Like run_simulations without per-history rows (O(30) memory)
+  - Returns: count, mean, m2 and a diagnostics dict; variance is m2 / (count - 1), and
+    diagnostics["total"] holds the column sums (exact event totals, unlike mean * count)
+
+ENERGY DEPOSITION:
+Every history fills a length-30 deposition vector: delta_k[i] per event i, the terminating energy in
+column 28 and the attachment energy in column 29, which add up to the incident energy.
+
+check_energy(eV, chunk_residual, residual, first_history): warns once a chunk exceeds energy_tolerance * eV
+energy_report(eV, deposition, residual): the deposition and energy balance entries of diagnostics
+
+SPECTRA:
+spectrum_grid(eV, min_energy, bins) / spectrum_add(spectra, row, energy, spectrum_lo, spectrum_scale):
+  - O(1) log-spaced binning inside run_sim: row 0 collisions, row 1 ejected secondaries
+spectrum_edges(eV, min_energy, bins): the bin edges in eV
+degradation_spectrum(collisions, edges, simulations): collision density / total cross section per eV
+
+CONVERGENCE:
+summary_columns: the 30 monitored quantities, code_names + terminating and attachment energy
+monitored_columns(monitor, eV): column names or indices to indices, None for every channel open at eV
+chunk_moments(values): count, mean and m2 of one chunk, merged with merge_welford
+relative_standard_error(count, mean, m2) / has_converged(count, mean, m2, target_rse, monitor)
+
+MULTI-ENERGY FUNCTIONS:
+
+run_multi_energy_batch(energies, histories, min_energy=1, sampler=0, tables=None, seed=0, first_history=0, threads=1):
+  - One launch for many incident energies, longest histories dealt round-robin across thread blocks
+  - Returns: count (n,), mean (n, 30), m2 (n, 30), total (n, 30), stack growths (n,), deposition (n, 30),
+    residual (n,)
+
+run_multi_energy_simulations(energies, total_sims, min_energy=1, chunk_size=500, sampler="analytic", points_per_decade=100, seed=None):
+  - Interface on terminal, returns count, mean, m2 per energy and a diagnostics dict
+  - Equals run_summary_simulations per energy for the analytic sampler only; a table/alias sampler
+    is built once up to the highest energy, so its grid differs from a single run's
 
 GENERATION FUNCTIONS:
 
-sim_generation(eV):
-  - Tracks events by electron generation (primary, secondary, tertiary, etc.)
-  - Records up to 10 generations in gen_data[generation][event_index]
-  - Useful for understanding depth, energy transfer and events caused by generations
+generation_capacity(eV, min_energy): rows needed for gen_data (no generation deeper than log2(eV / min_energy))
+
+sim_generation(eV, gen_data, min_energy=1, sampler=0, tables=None, seed=0, history=0, manipulated=-1, factor=1.10, trace=None):
+  - Tracks events by electron generation into the caller's gen_data, following the same collisions as run_sim
+  - Returns: terminating_energy, electron_attachment_energy, stack_growths, deepest generation, collisions
+
+trace_record(trace, at, index, energy, generation): writes one record if position at is in the buffers
 
-run_generation_simulations_batch(eV, total_sims):
-  - Batch execution with generation tracking
-  - Not parallelized to preserve generation statistics
+run_generation_simulations_batch(eV, total_sims, min_energy=1, sampler=0, tables=None, seed=0, first_history=0, threads=1):
+  - Parallelized batch execution with generation tracking, one accumulator per thread block
 
-run_generation_simulations(eV, total_sims, chunk_size=500):
+run_generation_simulations(eV, total_sims, min_energy=1, chunk_size=500, sampler="analytic", points_per_decade=100, seed=None, first_history=0, checkpoint=None, checkpoint_interval=60.0, resume=None):
   - Interface on terminal with progress tracking
   - Returns summed generation data across all simulations
 
+COMPILATION:
+warmup(samplers=("analytic", "table")):
+  - Compiles (or loads from the cache=True disk cache) every batch kernel with the wrappers' arguments
+  - Returns a list of (kernel, sampler, seconds)
+
+CHECKPOINTS:
+checkpoint(state) is called about every checkpoint_interval seconds with the chunk loop's accumulated
+state; passing it back as resume continues from state["completed"] with identical results.
+
+resume_seed(seed, resume): the checkpoint's seed, rejecting an explicit seed that contradicts it
+
 UTILITIES:
 combine_data(simulation_results):
   - Computes cumulative running average of simulation results
   - Useful for convergence analysis
 
-Stack size set to 20 elements (sufficient for typical depths) as daughter electrons are handled first (dealing in lower energies).
+STACK DEPTH:
+The ejected electron carries at most half of the remaining energy, so a history never holds more than
+floor(log2(eV / min_energy)) + 1 electrons.
 All energies in eV, event counts are integers.
 """
 
-@njit
+@njit(cache=True)
 def stack_push(stack, top, value):
     stack[top] = value
     return top + 1
 
-@njit
+@njit(cache=True)
+def stack_capacity(eV, min_energy):
+    return int(math.log2(eV / min_energy)) + 2
+
+@njit(cache=True)
+def stack_grow(stack):
+    grown = np.empty(2 * stack.shape[0], dtype=stack.dtype)
+    grown[:stack.shape[0]] = stack
+    return grown
+
+@njit(cache=True)
 def stack_pop(stack, top):
     if top==0:
         return 0, top
@@ -81,9 +159,30 @@ def stack_pop(stack, top):
     return stack[top], top
 
 
-@njit
-def ion_event(eV, index):
-    u = np.random.rand()
+@njit(cache=True)
+def spectrum_grid(eV, min_energy, bins):
+    lo = math.log(min(min_energy, min_energy_ion))
+    return lo, bins / (math.log(eV) - lo)
+
+@njit(cache=True)
+def spectrum_add(spectra, row, energy, spectrum_lo, spectrum_scale):
+    bins = spectra.shape[1]
+    if bins > 0:
+        k = int((math.log(energy) - spectrum_lo) * spectrum_scale)
+        spectra[row, min(max(k, 0), bins - 1)] += 1
+
+def spectrum_edges(eV, min_energy, bins):
+    return np.geomspace(min(min_energy, min_energy_ion), eV, bins + 1)
+
+def degradation_spectrum(collisions, edges, simulations):
+    centers = np.sqrt(edges[:-1] * edges[1:])
+    sigma_total = cross_sections(centers).sum(axis=1)
+    return collisions / (simulations * sigma_total * np.diff(edges))
+
+
+@njit(cache=True)
+def ion_event(eV, index, state):
+    u = rng_uniform(state)
     eV = eV - delta_k[index]
     x_max = (eV) / 2
     eV_new = (min_energy_ion * x_max) / (x_max - u * (x_max - min_energy_ion))
@@ -91,20 +190,35 @@ def ion_event(eV, index):
     return eV_old, eV_new
 
 
-@njit
-def run_sim(eV, min_energy=1, manipulated=-1):
-    E_stack = np.empty(20, dtype=np.float64)
+@njit(cache=True)
+def run_sim(eV, min_energy=1, manipulated=-1, sampler=0, tables=None, seed=0, history=0, factor=1.10, deposit=None, spectra=None):
+    state = history_stream(seed, history)
+    if spectra is not None:
+        spectrum_lo, spectrum_scale = spectrum_grid(eV, min_energy, spectra.shape[1])
+    E_stack = np.empty(stack_capacity(eV, min_energy), dtype=np.float64)
     event_count = np.zeros(28, dtype=np.float64)
+    scratch = np.empty(28, dtype=np.float64)
     top = 0
     top = stack_push(E_stack, top, eV)
     terminating_energy = 0
     electron_attachment_energy = 0
+    stack_growths = 0
     while top != 0:
         eV, top = stack_pop(E_stack, top)
-        indx = select_event(eV, manipulated)
+        indx = sample_event(eV, sampler, tables, scratch, state, manipulated, factor)
         event_count[indx] += 1
+        if deposit is not None:
+            if indx != 10:
+                deposit[indx] += delta_k[indx]
+        if spectra is not None:
+            spectrum_add(spectra, 0, eV, spectrum_lo, spectrum_scale)
         if indx < 7:
-            eV_old, eV_new = ion_event(eV, indx)
+            eV_old, eV_new = ion_event(eV, indx, state)
+            if spectra is not None:
+                spectrum_add(spectra, 1, eV_new, spectrum_lo, spectrum_scale)
+            if top + 2 > E_stack.shape[0]:
+                E_stack = stack_grow(E_stack)
+                stack_growths += 1
 
             if eV_old > min_energy:
                 top = stack_push(E_stack, top, eV_old)
@@ -124,137 +238,555 @@ def run_sim(eV, min_energy=1, manipulated=-1):
                     terminating_energy += eV
             else:
                 electron_attachment_energy += eV
-    return event_count, terminating_energy, electron_attachment_energy
-
-@njit(parallel=True)
-def run_batch_simulations(eV, storage, min_energy=1, manipulated=-1):
-    EA_size = int(storage.shape[0])
-    EA = np.empty(EA_size, dtype=np.float64)
-    t_e_size = int(storage.shape[0])
-    t_e = np.empty(t_e_size, dtype=np.float64)
-    for i in prange(storage.shape[0]):
-        storage[i], t_e[i], EA[i] = run_sim(eV, min_energy=min_energy, manipulated=manipulated)
-    return storage, t_e, EA
-
-def run_simulations(eV, total_sims, min_energy=1, manipulated=-1, chunk_size=500):
-    result = np.zeros((int(total_sims), 28), dtype=np.int64)
-    terminating_energy_total = np.zeros((int(total_sims)), dtype=np.float64)
-    EA_total =  np.zeros((int(total_sims)), dtype=np.float64)
+    if deposit is not None:
+        deposit[28] += terminating_energy
+        deposit[29] += electron_attachment_energy
+    return event_count, terminating_energy, electron_attachment_energy, stack_growths
+
+@njit(parallel=True, cache=True)
+def run_batch_simulations(eV, storage, min_energy=1, manipulated=-1, sampler=0, tables=None, seed=0, first_history=0, factor=1.10, threads=1, spectrum_bins=0):
+    n = storage.shape[0]
+    EA = np.empty(n, dtype=np.float64)
+    t_e = np.empty(n, dtype=np.float64)
+    deposits = np.zeros((n, 30), dtype=np.float64)
+    blocks = min(threads, n)
+    stack_growths_block = np.zeros(blocks, dtype=np.int64)
+    spectra_block = np.zeros((blocks, 2, spectrum_bins), dtype=np.int64)
+    for b in prange(blocks):
+        for i in range(b * n // blocks, (b + 1) * n // blocks):
+            storage[i], t_e[i], EA[i], growths = run_sim(eV, min_energy=min_energy, manipulated=manipulated, sampler=sampler, tables=tables, seed=seed, history=first_history + i, factor=factor, deposit=deposits[i], spectra=spectra_block[b])
+            stack_growths_block[b] += growths
+    return storage, t_e, EA, stack_growths_block.sum(), deposits, spectra_block.sum(axis=0)
+
+def run_simulations(eV, total_sims, min_energy=1, manipulated=-1, chunk_size=500, sampler="analytic", points_per_decade=100, sink=None, target_rse=None, monitor=None, seed=None, first_history=0, checkpoint=None, checkpoint_interval=60.0, resume=None, factor=1.10, spectrum_bins=0, stoichiometry=None):
+    started = time.perf_counter()
+    first_chunk_seconds = None
+    if sink is None and (checkpoint is not None or resume is not None):
+        raise ValueError("standard runs can only be checkpointed or resumed when streaming to a sink")
+    sampler, tables = build_sampler(sampler, eV, min_energy, points_per_decade, manipulated, factor)
+    seed = resume_seed(seed, resume)
+    monitor = monitored_columns(monitor, eV)
+    count = 0
+    mean = np.zeros(30, dtype=np.float64)
+    m2 = np.zeros(30, dtype=np.float64)
+    converged = False
+    if sink is None:
+        result = np.zeros((int(total_sims), 28), dtype=np.int64)
+        terminating_energy_total = np.zeros((int(total_sims)), dtype=np.float64)
+        EA_total =  np.zeros((int(total_sims)), dtype=np.float64)
+    else:
+        result = None
+        terminating_energy_total = 0.0
+        EA_total = 0.0
+        temp_storage = np.empty((int(min(chunk_size, total_sims)), 28), dtype=np.int64)
+    stack_growths = 0
+    deposition = np.zeros(30, dtype=np.float64)
+    residual = 0.0
+    spectra = np.zeros((2, spectrum_bins), dtype=np.int64)
+    projection = np.zeros((28, 0)) if stoichiometry is None else np.asarray(stoichiometry, dtype=np.float64)
+    species = (0, np.zeros(projection.shape[1]), np.zeros(projection.shape[1]))
+    species_total = np.zeros(projection.shape[1])
+    completed = 0
+    if resume is not None:
+        completed = resume["completed"]
+        terminating_energy_total = resume["terminating_energy"]
+        EA_total = resume["attachment_energy"]
+        stack_growths = resume["stack_growths"]
+        deposition, residual = resume["deposition"], resume["energy_residual"]
+        spectra = resume["spectra"]
+        count, mean, m2 = resume["count"], resume["mean"], resume["m2"]
+        species = (resume["species_count"], resume["species_mean"], resume["species_m2"])
+        species_total = resume["species_total"]
+        converged = target_rse is not None and has_converged(count, mean, m2, target_rse, monitor)
+    last_checkpoint = time.monotonic()
     print(f'Running {eV}eV electron simulations for {total_sims} iterations...')
 
-    with tqdm(total=total_sims, unit="sim") as pbar:
-        completed = 0
-        while completed < total_sims:
+    with tqdm(total=total_sims, initial=completed, unit="sim") as pbar:
+        while completed < total_sims and not converged:
             n = int(min(chunk_size, total_sims - completed))
-            temp_storage = np.empty((n, 28), dtype=np.int64)
-            chunk, terminating_energy, EA_chunk = run_batch_simulations(eV, temp_storage, min_energy=min_energy, manipulated=manipulated)
-            result[completed:completed+n] = chunk
-            terminating_energy_total[completed:completed+n] = terminating_energy
-            EA_total[completed:completed+n] = EA_chunk
+            if sink is None:
+                temp_storage = np.empty((n, 28), dtype=np.int64)
+            chunk, terminating_energy, EA_chunk, growths, deposits, chunk_spectra = run_batch_simulations(eV, temp_storage[:n], min_energy=min_energy, manipulated=manipulated, sampler=sampler, tables=tables, seed=np.uint64(seed), first_history=first_history + completed, factor=factor, threads=get_num_threads(), spectrum_bins=spectrum_bins)
+            if sink is None:
+                result[completed:completed+n] = chunk
+                terminating_energy_total[completed:completed+n] = terminating_energy
+                EA_total[completed:completed+n] = EA_chunk
+            else:
+                sink(chunk, terminating_energy, EA_chunk, completed)
+                terminating_energy_total += terminating_energy.sum()
+                EA_total += EA_chunk.sum()
+            if target_rse is not None:
+                values = np.column_stack((chunk, terminating_energy, EA_chunk))
+                count, mean, m2 = merge_welford(count, mean, m2, *chunk_moments(values))
+                converged = has_converged(count, mean, m2, target_rse, monitor)
+            chunk_species = chunk @ projection
+            species = merge_welford(*species, *chunk_moments(chunk_species))
+            species_total += chunk_species.sum(axis=0)
+            stack_growths += growths
+            deposition += deposits.sum(axis=0)
+            spectra += chunk_spectra
+            residual = check_energy(eV, np.abs(eV - deposits.sum(axis=1)).max(), residual, first_history + completed)
             completed += n
             pbar.update(n)
+            if first_chunk_seconds is None:
+                first_chunk_seconds = time.perf_counter() - started
+            if checkpoint is not None and time.monotonic() - last_checkpoint >= checkpoint_interval:
+                checkpoint({"completed": completed, "seed": seed, "terminating_energy": terminating_energy_total,
+                            "attachment_energy": EA_total, "stack_growths": stack_growths,
+                            "deposition": deposition, "energy_residual": residual, "spectra": spectra,
+                            "count": count, "mean": mean, "m2": m2, "species_count": species[0],
+                            "species_mean": species[1], "species_m2": species[2], "species_total": species_total})
+                last_checkpoint = time.monotonic()
+
+    if sink is None and completed < total_sims:
+        result = result[:completed]
+        terminating_energy_total = terminating_energy_total[:completed]
+        EA_total = EA_total[:completed]
+    diagnostics = {"stack_growths": stack_growths, "simulations": completed, "seed": seed,
+                   "seconds": time.perf_counter() - started, "first_chunk_seconds": first_chunk_seconds}
+    diagnostics.update(energy_report(eV, deposition, residual))
+    if spectrum_bins:
+        diagnostics.update(spectra=spectra, spectrum_edges=spectrum_edges(eV, min_energy, spectrum_bins))
+    if stoichiometry is not None:
+        diagnostics["species"] = (*species, species_total)
+    if target_rse is not None:
+        diagnostics.update(convergence_report(count, mean, m2, target_rse, monitor, converged))
+    return result, terminating_energy_total, EA_total, diagnostics
+
+
+summary_columns = code_names + ["Terminating Energy", "Electron Energy Captured"]
+
+def monitored_columns(monitor, eV):
+    if monitor is None:
+        return [i for i in range(28) if E_threshold[i] <= eV]
+    columns = []
+    for m in monitor:
+        if isinstance(m, str) and m not in summary_columns:
+            raise ValueError(f"unknown column {m!r}, expected one of {', '.join(summary_columns)}")
+        column = summary_columns.index(m) if isinstance(m, str) else int(m)
+        if not 0 <= column < len(summary_columns):
+            raise ValueError(f"column index {column} out of range 0-{len(summary_columns) - 1}")
+        if column >= 28 or E_threshold[column] <= eV:
+            columns.append(column)
+    if not columns:
+        raise ValueError(f"none of the monitored columns {list(monitor)} is open at {eV} eV")
+    return columns
+
+def chunk_moments(values):
+    values = np.asarray(values, dtype=np.float64)
+    mean = values.mean(axis=0)
+    m2 = ((values - mean) ** 2).sum(axis=0)
+    return len(values), mean, m2
+
+def relative_standard_error(count, mean, m2):
+    if count < 2:
+        return np.full(mean.shape, np.inf)
+    std_error = np.sqrt(m2 / (count - 1) / count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(mean != 0, std_error / np.abs(mean), np.inf)
+
+def has_converged(count, mean, m2, target_rse, monitor):
+    return bool(np.all(relative_standard_error(count, mean, m2)[monitor] <= target_rse))
+
+def convergence_report(count, mean, m2, target_rse, monitor, converged):
+    rse = relative_standard_error(count, mean, m2)[monitor]
+    worst = int(np.argmax(rse))
+    return {
+        "target_rse": target_rse,
+        "converged": converged,
+        "max_rse": float(rse[worst]),
+        "slowest_column": summary_columns[monitor[worst]],
+    }
+
+@njit(cache=True)
+def welford_update(count, mean, m2, values):
+    for j in range(values.shape[0]):
+        delta = values[j] - mean[j]
+        mean[j] += delta / count
+        m2[j] += delta * (values[j] - mean[j])
+
+@njit(cache=True)
+def merge_welford(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    count = count_a + count_b
+    if count == 0:
+        return count, mean_a.copy(), m2_a.copy()
+    delta = mean_b - mean_a
+    mean = mean_a + delta * (count_b / count)
+    m2 = m2_a + m2_b + delta * delta * (count_a * count_b / count)
+    return count, mean, m2
+
+@njit(parallel=True, cache=True)
+def run_summary_batch(eV, total_sims, min_energy=1, manipulated=-1, sampler=0, tables=None, seed=0, first_history=0, threads=1, factor=1.10, spectrum_bins=0):
+    blocks = min(threads, total_sims)
+    count_block = np.zeros(blocks, dtype=np.int64)
+    mean_block = np.zeros((blocks, 30), dtype=np.float64)
+    m2_block = np.zeros((blocks, 30), dtype=np.float64)
+    total_block = np.zeros((blocks, 30), dtype=np.float64)
+    stack_growths_block = np.zeros(blocks, dtype=np.int64)
+    deposition_block = np.zeros((blocks, 30), dtype=np.float64)
+    residual_block = np.zeros(blocks, dtype=np.float64)
+    spectra_block = np.zeros((blocks, 2, spectrum_bins), dtype=np.int64)
+    for b in prange(blocks):
+        values = np.empty(30, dtype=np.float64)
+        deposit = np.empty(30, dtype=np.float64)
+        for i in range(b * total_sims // blocks, (b + 1) * total_sims // blocks):
+            deposit[:] = 0.0
+            event_count, terminating_energy, electron_attachment_energy, growths = run_sim(eV, min_energy=min_energy, manipulated=manipulated, sampler=sampler, tables=tables, seed=seed, history=first_history + i, factor=factor, deposit=deposit, spectra=spectra_block[b])
+            values[:28] = event_count
+            values[28] = terminating_energy
+            values[29] = electron_attachment_energy
+            count_block[b] += 1
+            welford_update(count_block[b], mean_block[b], m2_block[b], values)
+            total_block[b] += values
+            stack_growths_block[b] += growths
+            deposition_block[b] += deposit
+            residual_block[b] = max(residual_block[b], abs(eV - deposit.sum()))
+    count = 0
+    mean = np.zeros(30, dtype=np.float64)
+    m2 = np.zeros(30, dtype=np.float64)
+    for b in range(blocks):
+        count, mean, m2 = merge_welford(count, mean, m2, count_block[b], mean_block[b], m2_block[b])
+    return count, mean, m2, total_block.sum(axis=0), stack_growths_block.sum(), deposition_block.sum(axis=0), residual_block.max(), spectra_block.sum(axis=0)
+
+def run_summary_simulations(eV, total_sims, min_energy=1, manipulated=-1, chunk_size=500, sampler="analytic", points_per_decade=100, target_rse=None, monitor=None, seed=None, first_history=0, checkpoint=None, checkpoint_interval=60.0, resume=None, factor=1.10, spectrum_bins=0):
+    started = time.perf_counter()
+    first_chunk_seconds = None
+    sampler, tables = build_sampler(sampler, eV, min_energy, points_per_decade, manipulated, factor)
+    seed = resume_seed(seed, resume)
+    monitor = monitored_columns(monitor, eV)
+    converged = False
+    count = 0
+    mean = np.zeros(30, dtype=np.float64)
+    m2 = np.zeros(30, dtype=np.float64)
+    total = np.zeros(30, dtype=np.float64)
+    stack_growths = 0
+    deposition = np.zeros(30, dtype=np.float64)
+    residual = 0.0
+    spectra = np.zeros((2, spectrum_bins), dtype=np.int64)
+    completed = 0
+    if resume is not None:
+        completed = resume["completed"]
+        total = resume["total"]
+        stack_growths = resume["stack_growths"]
+        deposition, residual = resume["deposition"], resume["energy_residual"]
+        spectra = resume["spectra"]
+        count, mean, m2 = resume["count"], resume["mean"], resume["m2"]
+        converged = target_rse is not None and has_converged(count, mean, m2, target_rse, monitor)
+    last_checkpoint = time.monotonic()
+    print(f'Running {eV}eV electron simulations for {total_sims} iterations...')
 
-    return result, terminating_energy_total, EA_total
-
-
-@njit
+    with tqdm(total=total_sims, initial=completed, unit="sim") as pbar:
+        while completed < total_sims and not converged:
+            n = int(min(chunk_size, total_sims - completed))
+            chunk_count, chunk_mean, chunk_m2, chunk_total, growths, chunk_deposition, chunk_residual, chunk_spectra = run_summary_batch(eV, n, min_energy=min_energy, manipulated=manipulated, sampler=sampler, tables=tables, seed=np.uint64(seed), first_history=first_history + completed, threads=get_num_threads(), factor=factor, spectrum_bins=spectrum_bins)
+            count, mean, m2 = merge_welford(count, mean, m2, chunk_count, chunk_mean, chunk_m2)
+            total += chunk_total
+            if target_rse is not None:
+                converged = has_converged(count, mean, m2, target_rse, monitor)
+            stack_growths += growths
+            deposition += chunk_deposition
+            spectra += chunk_spectra
+            residual = check_energy(eV, chunk_residual, residual, first_history + completed)
+            completed += n
+            pbar.update(n)
+            if first_chunk_seconds is None:
+                first_chunk_seconds = time.perf_counter() - started
+            if checkpoint is not None and time.monotonic() - last_checkpoint >= checkpoint_interval:
+                checkpoint({"completed": completed, "seed": seed, "stack_growths": stack_growths,
+                            "deposition": deposition, "energy_residual": residual, "spectra": spectra,
+                            "count": count, "mean": mean, "m2": m2, "total": total})
+                last_checkpoint = time.monotonic()
+
+    diagnostics = {"stack_growths": stack_growths, "simulations": completed, "seed": seed, "total": total,
+                   "seconds": time.perf_counter() - started, "first_chunk_seconds": first_chunk_seconds}
+    diagnostics.update(energy_report(eV, deposition, residual))
+    if spectrum_bins:
+        diagnostics.update(spectra=spectra, spectrum_edges=spectrum_edges(eV, min_energy, spectrum_bins))
+    if target_rse is not None:
+        diagnostics.update(convergence_report(count, mean, m2, target_rse, monitor, converged))
+    return count, mean, m2, diagnostics
+
+
+def resume_seed(seed, resume):
+    if resume is None:
+        return resolve_seed(seed)
+    if seed is not None and resolve_seed(seed) != resume["seed"]:
+        raise ValueError(f"seed {seed} does not match the checkpoint's seed {resume['seed']}")
+    return resume["seed"]
+
+
+energy_tolerance = 1e-9
+
+def check_energy(eV, chunk_residual, residual, first_history):
+    if chunk_residual > energy_tolerance * eV and residual <= energy_tolerance * eV:
+        tqdm.write(f"WARNING: energy not conserved in the chunk starting at history {first_history} "
+                   f"(largest imbalance {chunk_residual:.3e} eV)")
+    return max(residual, float(chunk_residual))
+
+def energy_report(eV, deposition, residual):
+    return {"deposition": deposition, "energy_residual": residual,
+            "energy_conserved": residual <= energy_tolerance * eV}
+
+
+@njit(parallel=True, cache=True)
+def run_multi_energy_batch(energies, histories, min_energy=1, sampler=0, tables=None, seed=0, first_history=0, threads=1):
+    n_energies = energies.shape[0]
+    n_items = histories.sum()
+    item_energy = np.empty(n_items, dtype=np.int64)
+    item_history = np.empty(n_items, dtype=np.int64)
+    i = 0
+    for k in np.argsort(-energies):
+        for j in range(histories[k]):
+            item_energy[i] = k
+            item_history[i] = first_history + j
+            i += 1
+    blocks = max(min(threads, n_items), 1)
+    count_block = np.zeros((blocks, n_energies), dtype=np.int64)
+    mean_block = np.zeros((blocks, n_energies, 30), dtype=np.float64)
+    m2_block = np.zeros((blocks, n_energies, 30), dtype=np.float64)
+    total_block = np.zeros((blocks, n_energies, 30), dtype=np.float64)
+    stack_growths_block = np.zeros((blocks, n_energies), dtype=np.int64)
+    deposition_block = np.zeros((blocks, n_energies, 30), dtype=np.float64)
+    residual_block = np.zeros((blocks, n_energies), dtype=np.float64)
+    for b in prange(blocks):
+        values = np.empty(30, dtype=np.float64)
+        deposit = np.empty(30, dtype=np.float64)
+        for i in range(b, n_items, blocks):
+            k = item_energy[i]
+            deposit[:] = 0.0
+            event_count, terminating_energy, electron_attachment_energy, growths = run_sim(energies[k], min_energy=min_energy, sampler=sampler, tables=tables, seed=seed, history=item_history[i], deposit=deposit)
+            values[:28] = event_count
+            values[28] = terminating_energy
+            values[29] = electron_attachment_energy
+            count_block[b, k] += 1
+            welford_update(count_block[b, k], mean_block[b, k], m2_block[b, k], values)
+            total_block[b, k] += values
+            stack_growths_block[b, k] += growths
+            deposition_block[b, k] += deposit
+            residual_block[b, k] = max(residual_block[b, k], abs(energies[k] - deposit.sum()))
+    count = np.zeros(n_energies, dtype=np.int64)
+    mean = np.zeros((n_energies, 30), dtype=np.float64)
+    m2 = np.zeros((n_energies, 30), dtype=np.float64)
+    residual = np.zeros(n_energies, dtype=np.float64)
+    for k in range(n_energies):
+        for b in range(blocks):
+            count[k], mean[k], m2[k] = merge_welford(count[k], mean[k], m2[k], count_block[b, k], mean_block[b, k], m2_block[b, k])
+            residual[k] = max(residual[k], residual_block[b, k])
+    return count, mean, m2, total_block.sum(axis=0), stack_growths_block.sum(axis=0), deposition_block.sum(axis=0), residual
+
+def run_multi_energy_simulations(energies, total_sims, min_energy=1, chunk_size=500, sampler="analytic", points_per_decade=100, seed=None):
+    energies = np.asarray(energies, dtype=np.float64)
+    total_sims = np.broadcast_to(np.asarray(total_sims, dtype=np.int64), energies.shape)
+    sampler, tables = build_sampler(sampler, float(energies.max()), min_energy, points_per_decade)
+    seed = resolve_seed(seed)
+    count = np.zeros(len(energies), dtype=np.int64)
+    mean = np.zeros((len(energies), 30), dtype=np.float64)
+    m2 = np.zeros((len(energies), 30), dtype=np.float64)
+    total = np.zeros((len(energies), 30), dtype=np.float64)
+    stack_growths = np.zeros(len(energies), dtype=np.int64)
+    deposition = np.zeros((len(energies), 30), dtype=np.float64)
+    residual = np.zeros(len(energies), dtype=np.float64)
+    started = time.perf_counter()
+    print(f'Running {len(energies)} incident energies from {energies.min()}eV to {energies.max()}eV...')
+
+    with tqdm(total=int(total_sims.sum()), unit="sim") as pbar:
+        completed = 0
+        while completed < total_sims.max():
+            histories = np.clip(total_sims - completed, 0, chunk_size)
+            chunk_count, chunk_mean, chunk_m2, chunk_total, growths, chunk_deposition, chunk_residual = run_multi_energy_batch(energies, histories, min_energy=min_energy, sampler=sampler, tables=tables, seed=np.uint64(seed), first_history=completed, threads=get_num_threads())
+            for k in range(len(energies)):
+                count[k], mean[k], m2[k] = merge_welford(count[k], mean[k], m2[k], chunk_count[k], chunk_mean[k], chunk_m2[k])
+                residual[k] = check_energy(energies[k], chunk_residual[k], residual[k], completed)
+            total += chunk_total
+            stack_growths += growths
+            deposition += chunk_deposition
+            completed += chunk_size
+            pbar.update(int(histories.sum()))
+
+    diagnostics = {"stack_growths": stack_growths, "simulations": count, "seed": seed, "total": total,
+                   "seconds": time.perf_counter() - started, "deposition": deposition, "energy_residual": residual,
+                   "energy_conserved": residual <= energy_tolerance * energies}
+    return count, mean, m2, diagnostics
+
+
+@njit(cache=True)
 def stack_push_gen(gen_stack, energy_stack, top, energy, generation):
     gen_stack[top] = generation
     energy_stack[top] = energy
     return top + 1
 
-@njit
+@njit(cache=True)
+def stack_grow_gen(gen_stack, energy_stack):
+    return stack_grow(gen_stack), stack_grow(energy_stack)
+
+@njit(cache=True)
 def stack_pop_gen(gen_stack, energy_stack, top):
     if top == 0:
         return 0, 0.0, top
     top -= 1
     return gen_stack[top], energy_stack[top], top
 
-@njit    
-def ion_gen_event(generation, energy, index):
+@njit(cache=True)
+def ion_gen_event(generation, energy, index, state):
     gen_new = generation + 1
     eV = energy - delta_k[index]
-    u = np.random.rand()
+    u = rng_uniform(state)
     x_max = eV / 2
     eV_new = (min_energy_ion * x_max) / (x_max - u * (x_max - min_energy_ion))
     eV_old = eV - eV_new
 
     return eV_new, gen_new, eV_old
 
-@njit
-def sim_generation(eV, min_energy=1):
+@njit(cache=True)
+def generation_capacity(eV, min_energy):
+    return int(math.log2(eV / min_energy)) + 2
+
+@njit(cache=True)
+def trace_record(trace, at, index, energy, generation):
+    events, energies, generations = trace
+    if at < events.shape[0]:
+        events[at] = index
+        energies[at] = energy
+        generations[at] = generation
+
+@njit(cache=True)
+def sim_generation(eV, gen_data, min_energy=1, sampler=0, tables=None, seed=0, history=0, manipulated=-1, factor=1.10, trace=None):
+    state = history_stream(seed, history)
     terminating_energy = 0.0
     electron_attachment_energy = 0.0
     
-    gen_stack = np.empty(20, dtype=np.int32)
-    energy_stack = np.empty(20, dtype=np.float64)
+    capacity = stack_capacity(eV, min_energy)
+    gen_stack = np.empty(capacity, dtype=np.int32)
+    energy_stack = np.empty(capacity, dtype=np.float64)
     top = 0
+    stack_growths = 0
     
     generation = 0
-    gen_data = np.zeros((10, 28), dtype=np.int64)
+    max_generation = 0
+    collisions = 0
+    scratch = np.empty(28, dtype=np.float64)
     
     top = stack_push_gen(gen_stack, energy_stack, top, eV, generation)
     
     while top != 0:
         generation, energy, top = stack_pop_gen(gen_stack, energy_stack, top)
         
-        indx = select_event(energy)
+        indx = sample_event(energy, sampler, tables, scratch, state, manipulated, factor)
         gen_data[generation][indx] += 1
+        if trace is not None:
+            trace_record(trace, collisions, indx, energy, generation)
+        collisions += 1
         
         if indx < 7:
-            eV_new, gen_new, eV_update = ion_gen_event(generation, energy, indx)
-
-            if eV_update < min_energy:
-                terminating_energy += eV_update
-            else:
+            eV_new, gen_new, eV_update = ion_gen_event(generation, energy, indx, state)
+            if gen_new >= gen_data.shape[0]:
+                raise IndexError("generation depth exceeded generation_capacity")
+            if top + 2 > energy_stack.shape[0]:
+                gen_stack, energy_stack = stack_grow_gen(gen_stack, energy_stack)
+                stack_growths += 1
+
+            if eV_update > min_energy:
                 top = stack_push_gen(gen_stack, energy_stack, top, eV_update, generation)
-
-            if eV_new < min_energy:
-                terminating_energy += eV_new
             else:
+                terminating_energy += eV_update
+
+            if eV_new > min_energy:
                 top = stack_push_gen(gen_stack, energy_stack, top, eV_new, gen_new)
+                max_generation = max(max_generation, gen_new)
+            else:
+                terminating_energy += eV_new
         else:
             if indx != 10:
                 energy = energy - delta_k[indx]
-                if energy < min_energy:
-                    terminating_energy += energy
-                else:
+                if energy > min_energy:
                     top = stack_push_gen(gen_stack, energy_stack, top, energy, generation)
+                else:
+                    terminating_energy += energy
             else:
                 electron_attachment_energy += energy
                 
-    return gen_data, terminating_energy, electron_attachment_energy
-
-@njit
-def run_generation_simulations_batch(eV, total_sims, min_energy=1):
-    storage = np.zeros((total_sims, 10, 28), dtype=np.int64)
-    terminating_energy_total = 0.0
-    electron_attachment_energy_total = 0.0
-    for i in range(total_sims):
-        simulation, terminating_energy, electron_attachment_energy = sim_generation(eV, min_energy=min_energy)
-        storage[i] = simulation
-        terminating_energy_total += terminating_energy
-        electron_attachment_energy_total += electron_attachment_energy
-    return storage.sum(axis=0), terminating_energy_total, electron_attachment_energy_total
-
-
-def run_generation_simulations(eV, total_sims, min_energy=1, chunk_size=500):
-    result = np.zeros((10, 28), dtype=np.int64)
+    return terminating_energy, electron_attachment_energy, stack_growths, max_generation, collisions
+
+@njit(parallel=True, cache=True)
+def run_generation_simulations_batch(eV, total_sims, min_energy=1, sampler=0, tables=None, seed=0, first_history=0, threads=1):
+    blocks = min(threads, total_sims)
+    gen_totals = np.zeros((blocks, generation_capacity(eV, min_energy), 28), dtype=np.int64)
+    terminating_energy_block = np.zeros(blocks, dtype=np.float64)
+    electron_attachment_energy_block = np.zeros(blocks, dtype=np.float64)
+    stack_growths_block = np.zeros(blocks, dtype=np.int64)
+    max_generation_block = np.zeros(blocks, dtype=np.int64)
+    for b in prange(blocks):
+        for i in range(b * total_sims // blocks, (b + 1) * total_sims // blocks):
+            terminating_energy, electron_attachment_energy, growths, max_generation, _ = sim_generation(eV, gen_totals[b], min_energy=min_energy, sampler=sampler, tables=tables, seed=seed, history=first_history + i)
+            terminating_energy_block[b] += terminating_energy
+            electron_attachment_energy_block[b] += electron_attachment_energy
+            stack_growths_block[b] += growths
+            max_generation_block[b] = max(max_generation_block[b], max_generation)
+    return gen_totals.sum(axis=0), terminating_energy_block.sum(), electron_attachment_energy_block.sum(), stack_growths_block.sum(), max_generation_block.max()
+
+
+def run_generation_simulations(eV, total_sims, min_energy=1, chunk_size=500, sampler="analytic", points_per_decade=100, seed=None, first_history=0, checkpoint=None, checkpoint_interval=60.0, resume=None):
+    started = time.perf_counter()
+    first_chunk_seconds = None
+    sampler, tables = build_sampler(sampler, eV, min_energy, points_per_decade)
+    seed = resume_seed(seed, resume)
+    result = np.zeros((generation_capacity(eV, min_energy), 28), dtype=np.int64)
     terminating_energy_total = 0.0
     electron_attachment_energy_total = 0.0
+    stack_growths = 0
+    deepest = 0
+    completed = 0
+    if resume is not None:
+        completed = resume["completed"]
+        terminating_energy_total = resume["terminating_energy"]
+        electron_attachment_energy_total = resume["attachment_energy"]
+        stack_growths = resume["stack_growths"]
+        deepest = resume["deepest"]
+        result[:len(resume["result"])] = resume["result"]
+    last_checkpoint = time.monotonic()
     print(f'Running {eV}eV electron simulations for {total_sims} iterations...')
-    with tqdm(total=total_sims, unit="sim") as pbar:
-        completed = 0
+    with tqdm(total=total_sims, initial=completed, unit="sim") as pbar:
         while completed < total_sims:
             n = min(chunk_size, total_sims - completed)
-            chunk, terminating_energy, electron_attachment_energy = run_generation_simulations_batch(eV, n, min_energy=min_energy)
+            chunk, terminating_energy, electron_attachment_energy, growths, max_generation = run_generation_simulations_batch(eV, n, min_energy=min_energy, sampler=sampler, tables=tables, seed=np.uint64(seed), first_history=first_history + completed, threads=get_num_threads())
             result += chunk
             terminating_energy_total += terminating_energy
             electron_attachment_energy_total += electron_attachment_energy
+            stack_growths += growths
+            deepest = max(deepest, int(max_generation))
             completed += n
             pbar.update(n)
-
-    return result, terminating_energy_total, electron_attachment_energy_total
+            if first_chunk_seconds is None:
+                first_chunk_seconds = time.perf_counter() - started
+            if checkpoint is not None and time.monotonic() - last_checkpoint >= checkpoint_interval:
+                checkpoint({"completed": completed, "seed": seed, "terminating_energy": terminating_energy_total,
+                            "attachment_energy": electron_attachment_energy_total, "stack_growths": stack_growths,
+                            "deepest": deepest, "result": result[:deepest + 1]})
+                last_checkpoint = time.monotonic()
+
+    diagnostics = {"stack_growths": stack_growths, "seed": seed,
+                   "seconds": time.perf_counter() - started, "first_chunk_seconds": first_chunk_seconds}
+    return result[:deepest + 1], terminating_energy_total, electron_attachment_energy_total, diagnostics
+
+def warmup(samplers=("analytic", "table")):
+    timings = []
+    for name in samplers:
+        sampler, tables = build_sampler(name, 20.0, 1.0)
+        storage = np.empty((1, 28), dtype=np.int64)
+        kernels = [
+            ("run_batch_simulations", lambda: run_batch_simulations(20.0, storage[:1], min_energy=1.0, manipulated=-1, sampler=sampler, tables=tables, seed=np.uint64(0), first_history=0, factor=1.10, threads=get_num_threads(), spectrum_bins=0)),
+            ("run_summary_batch", lambda: run_summary_batch(20.0, 1, min_energy=1.0, manipulated=-1, sampler=sampler, tables=tables, seed=np.uint64(0), first_history=0, threads=get_num_threads(), factor=1.10, spectrum_bins=0)),
+            ("run_generation_simulations_batch", lambda: run_generation_simulations_batch(20.0, 1, min_energy=1.0, sampler=sampler, tables=tables, seed=np.uint64(0), first_history=0, threads=get_num_threads())),
+            ("run_multi_energy_batch", lambda: run_multi_energy_batch(np.array([20.0]), np.array([1], dtype=np.int64), min_energy=1.0, sampler=sampler, tables=tables, seed=np.uint64(0), first_history=0, threads=get_num_threads())),
+        ]
+        for kernel, call in kernels:
+            start = time.perf_counter()
+            call()
+            timings.append((kernel, name, time.perf_counter() - start))
+    start = time.perf_counter()
+    merge_welford(0, np.zeros(30), np.zeros(30), 1, np.zeros(30), np.zeros(30))
+    timings.append(("merge_welford", "-", time.perf_counter() - start))
+    return timings
 
 def combine_data(simulation_results):
     cumsum = np.cumsum(simulation_results, axis=0)
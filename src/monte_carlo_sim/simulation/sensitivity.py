@@ -0,0 +1,195 @@
+import time
+import numpy as np
+from tqdm import tqdm
+from numba import njit, prange, get_num_threads
+from monte_carlo_sim.simulation.sampling import build_sampler
+from monte_carlo_sim.simulation.cross_section import E_threshold
+from monte_carlo_sim.simulation.rng import resolve_seed
+from monte_carlo_sim.simulation.constants import code_names
+from monte_carlo_sim.simulation.run_simulation import run_sim, welford_update, merge_welford
+
+"""
+Cross Section Sensitivity Analysis in a Single Pass
+
+Scaling one channel's cross section by factor (run_sim's manipulated argument) and rerunning is how
+a channel's influence on the yields is measured. Doing that for every channel means 28 perturbed
+runs plus a baseline, and the difference of two independent runs is buried in the noise of both.
+
+Here every history is simulated once unperturbed and once per perturbed channel, all from the same
+random stream (seed, history) (common random numbers). The perturbed copy follows the baseline
+exactly until the first collision whose selection the perturbation changes, so the per-history
+difference varies far less than two independent runs would, and its mean and standard error are
+accumulated directly. Perturbed variant k of a history is identical to that history in
+run_summary_simulations(manipulated=channels[k], factor=factor) with the same seed.
+
+Likelihood ratio reweighting of the baseline histories was not used: the weight is a product over
+every collision of the history, and with thousands of collisions per keV-range history its
+variance grows out of bounds.
+
+FUNCTIONS:
+
+variant_sampler(sampler, eV, min_energy, channels, factor=1.10, points_per_decade=100):
+  - (sampler code, tables) like sampling.build_sampler, with the cross section (and alias) tables of
+    the baseline and every perturbed channel stacked along a leading variant axis
+  - The analytic sampler needs no tables, it applies manipulated/factor per collision
+
+run_sensitivity_batch(eV, total_sims, channels, min_energy=1, factor=1.10, sampler=0, tables=None, seed=0, first_history=0, threads=1):
+  - Runs histories first_history ... first_history + total_sims - 1, each as the baseline followed
+    by one variant per entry of channels, split into one contiguous block per thread
+  - Row 0 of mean/m2 holds the Welford moments of the baseline (the 30 summary_columns), row k + 1
+    the moments of (variant k - baseline) per history
+  - Returns: count, mean (len(channels) + 1, 30), m2 (len(channels) + 1, 30), the baseline's column
+    sums (30,) and stack growths
+
+sensitivity_channels(channels, eV):
+  - Converts channel code names or indices into an int64 array of channel indices, raising ValueError
+    for unknown names and indices outside 0-27
+  - None selects every channel open at eV; a closed channel has a zero cross section, so scaling it
+    changes nothing and it is not simulated
+
+run_sensitivity_simulations(eV, total_sims, min_energy=1, factor=1.10, channels=None, chunk_size=500, sampler="analytic", points_per_decade=100, seed=None):
+  - Interface on terminal with progress tracking
+  - channels as in sensitivity_channels
+  - Returns count, mean, m2 as above, the channels that were perturbed and a diagnostics dict
+    (diagnostics["total"] holds the baseline's column sums)
+  - Costs len(channels) + 1 histories per history, but needs no separate baseline run and far
+    fewer histories than independent reruns for the same uncertainty
+
+sensitivity_matrix(count, mean, m2, channels, factor=1.10):
+  - (28, 30) relative sensitivity coefficients S[j, i] = (delta mean_i / mean_i) / (factor - 1),
+    the relative change of quantity i per relative change of channel j's cross section
+  - Also returns their standard errors; rows of channels that were not perturbed are NaN, so they
+    cannot be mistaken for a measured zero response, and so are columns whose baseline mean is 0
+  - The error combines the standard error of the mean difference with that of the baseline mean;
+    the covariance between the two is not tracked, which overestimates the error slightly
+
+warmup_sensitivity(samplers=("analytic", "table")):
+  - Compiles run_sensitivity_batch with the argument types run_sensitivity_simulations passes, like
+    run_simulation.warmup, and returns the same (kernel, sampler, seconds) list
+
+All energies in eV.
+"""
+
+
+def variant_sampler(sampler, eV, min_energy, channels, factor=1.10, points_per_decade=100):
+    code, tables = build_sampler(sampler, eV, min_energy, points_per_decade)
+    if tables is None:
+        return code, None
+    variants = [tables] + [build_sampler(sampler, eV, min_energy, points_per_decade, k, factor)[1] for k in channels]
+    return code, (tables[0], np.stack([v[1] for v in variants]), tables[2],
+                  np.stack([v[3] for v in variants]), np.stack([v[4] for v in variants]))
+
+
+@njit(cache=True)
+def run_variant(eV, v, channels, min_energy, factor, sampler, tables, seed, history):
+    if tables is None:
+        manipulated = -1 if v == 0 else channels[v - 1]
+        return run_sim(eV, min_energy=min_energy, manipulated=manipulated, sampler=sampler, tables=None, seed=seed, history=history, factor=factor)
+    variant = (tables[0], tables[1][v], tables[2], tables[3][v], tables[4][v])
+    return run_sim(eV, min_energy=min_energy, sampler=sampler, tables=variant, seed=seed, history=history)
+
+
+@njit(parallel=True, cache=True)
+def run_sensitivity_batch(eV, total_sims, channels, min_energy=1, factor=1.10, sampler=0, tables=None, seed=0, first_history=0, threads=1):
+    variants = channels.shape[0] + 1
+    blocks = min(threads, total_sims)
+    count_block = np.zeros(blocks, dtype=np.int64)
+    mean_block = np.zeros((blocks, variants, 30), dtype=np.float64)
+    m2_block = np.zeros((blocks, variants, 30), dtype=np.float64)
+    total_block = np.zeros((blocks, 30), dtype=np.float64)
+    stack_growths_block = np.zeros(blocks, dtype=np.int64)
+    for b in prange(blocks):
+        baseline = np.empty(30, dtype=np.float64)
+        values = np.empty(30, dtype=np.float64)
+        for i in range(b * total_sims // blocks, (b + 1) * total_sims // blocks):
+            count_block[b] += 1
+            for v in range(variants):
+                event_count, terminating_energy, electron_attachment_energy, growths = run_variant(eV, v, channels, min_energy, factor, sampler, tables, seed, first_history + i)
+                values[:28] = event_count
+                values[28] = terminating_energy
+                values[29] = electron_attachment_energy
+                if v == 0:
+                    baseline[:] = values
+                    total_block[b] += values
+                else:
+                    values -= baseline
+                welford_update(count_block[b], mean_block[b, v], m2_block[b, v], values)
+                stack_growths_block[b] += growths
+    count = 0
+    mean = np.zeros((variants, 30), dtype=np.float64)
+    m2 = np.zeros((variants, 30), dtype=np.float64)
+    for v in range(variants):
+        merged = 0
+        for b in range(blocks):
+            merged, mean[v], m2[v] = merge_welford(merged, mean[v], m2[v], count_block[b], mean_block[b, v], m2_block[b, v])
+        count = merged
+    return count, mean, m2, total_block.sum(axis=0), stack_growths_block.sum()
+
+
+def sensitivity_channels(channels, eV):
+    if channels is None:
+        return np.array([i for i in range(28) if E_threshold[i] <= eV], dtype=np.int64)
+    indices = []
+    for c in channels:
+        if isinstance(c, str) and c not in code_names:
+            raise ValueError(f"unknown channel {c!r}, expected one of {', '.join(code_names)}")
+        channel = code_names.index(c) if isinstance(c, str) else int(c)
+        if not 0 <= channel < 28:
+            raise ValueError(f"channel index {channel} out of range 0-27")
+        indices.append(channel)
+    return np.array(indices, dtype=np.int64)
+
+
+def run_sensitivity_simulations(eV, total_sims, min_energy=1, factor=1.10, channels=None, chunk_size=500, sampler="analytic", points_per_decade=100, seed=None):
+    started = time.perf_counter()
+    channels = sensitivity_channels(channels, eV)
+    sampler, tables = variant_sampler(sampler, eV, min_energy, channels, factor, points_per_decade)
+    seed = resolve_seed(seed)
+    count = 0
+    mean = np.zeros((len(channels) + 1, 30), dtype=np.float64)
+    m2 = np.zeros((len(channels) + 1, 30), dtype=np.float64)
+    total = np.zeros(30, dtype=np.float64)
+    stack_growths = 0
+    completed = 0
+    print(f'Running {eV}eV sensitivity analysis of {len(channels)} channels for {total_sims} iterations...')
+
+    with tqdm(total=total_sims, unit="sim") as pbar:
+        while completed < total_sims:
+            n = int(min(chunk_size, total_sims - completed))
+            chunk_count, chunk_mean, chunk_m2, chunk_total, growths = run_sensitivity_batch(eV, n, channels, min_energy=min_energy, factor=factor, sampler=sampler, tables=tables, seed=np.uint64(seed), first_history=completed, threads=get_num_threads())
+            for v in range(len(channels) + 1):
+                _, mean[v], m2[v] = merge_welford(count, mean[v], m2[v], chunk_count, chunk_mean[v], chunk_m2[v])
+            count += chunk_count
+            total += chunk_total
+            stack_growths += growths
+            completed += n
+            pbar.update(n)
+
+    diagnostics = {"stack_growths": stack_growths, "simulations": completed, "seed": seed, "factor": factor, "total": total,
+                   "seconds": time.perf_counter() - started}
+    return count, mean, m2, channels, diagnostics
+
+
+def sensitivity_matrix(count, mean, m2, channels, factor=1.10):
+    std_error = np.sqrt(m2 / (count - 1) / count) if count > 1 else np.full(m2.shape, np.nan)
+    baseline = mean[0]
+    response = np.full((28, 30), np.nan)
+    error = np.full((28, 30), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for k, channel in enumerate(channels):
+            delta = mean[k + 1]
+            response[channel] = np.where(baseline != 0, delta / baseline, np.nan) / (factor - 1)
+            error[channel] = np.where(baseline != 0, np.hypot(std_error[k + 1] / baseline,
+                                                              delta * std_error[0] / baseline ** 2), np.nan) / abs(factor - 1)
+    return response, error
+
+
+def warmup_sensitivity(samplers=("analytic", "table")):
+    timings = []
+    channels = np.array([0], dtype=np.int64)
+    for name in samplers:
+        sampler, tables = variant_sampler(name, 20.0, 1.0, channels)
+        start = time.perf_counter()
+        run_sensitivity_batch(20.0, 1, channels, min_energy=1.0, factor=1.10, sampler=sampler, tables=tables, seed=np.uint64(0), first_history=0, threads=get_num_threads())
+        timings.append(("run_sensitivity_batch", name, time.perf_counter() - start))
+    return timings
@@ -0,0 +1,246 @@
+import json
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from numba import set_num_threads
+from monte_carlo_sim.simulation.constants import code_names
+from monte_carlo_sim.simulation.rng import resolve_seed
+from monte_carlo_sim.simulation.run_simulation import (run_simulations, run_summary_simulations, run_generation_simulations,
+                                                       merge_welford, energy_report, spectrum_edges, degradation_spectrum)
+from monte_carlo_sim.simulation.species import species_names, stoichiometry, write_species_moments, write_species_summary, write_species_generations
+from monte_carlo_sim.file_writing.file_writing import (stream_s_csv, stream_s_npy, finalize_s_npy, open_s_csv, append_s_csv,
+                                                       open_s_npy, append_s_npy, read_s_chunks, write_s_readme,
+                                                       write_summary_csv, write_g_csv, write_g_readme,
+                                                       write_deposition_csv, write_spectra_csv, save_checkpoint, load_checkpoint,
+                                                       clear_checkpoint)
+
+"""
+Sharded Execution and Result Merging
+
+A run of total_sims histories is split into contiguous shards of history indices. Every shard uses
+the same seed, and a history's random stream depends only on (seed, history index) (see rng.py),
+so the shards can run as separate processes or on separate nodes and still reproduce the rows of a
+single-process run exactly. Each shard writes its own folder with a shard.json manifest, and
+merge_shards combines the folders into one results folder.
+
+FUNCTIONS:
+
+shard_bounds(total_sims, shards):
+  - Splits [0, total_sims) into shards contiguous (first_history, simulations) ranges whose sizes
+    differ by at most one
+
+run_shard(results_dir, mode, eV, total_sims, min_energy, shard, shards, seed, output_format="npy", sampler="analytic", points_per_decade=100, chunk_size=500, threads=None, spectrum_bins=0):
+  - Runs one shard into results_dir / shard_XXXX and returns that folder
+  - mode is "standard", "generational" or "summary"; standard shards stream their rows in
+    output_format ("npy" or "csv") and keep their species moments and totals in the manifest,
+    generational shards save generations.npy, summary shards keep their moments and column sums
+    in the manifest
+  - seed is required (every shard must share it), threads sets the numba threads of this process
+  - spectrum_bins > 0 records the electron spectra (standard and summary), kept in the manifest
+  - Checkpoints into the shard folder while running; if the folder already holds a checkpoint of
+    the same shard, the shard resumes from it instead of starting over
+
+run_sharded(results_dir, mode, eV, total_sims, min_energy, shards, seed=None, workers=None, threads=1, **options):
+  - Runs every shard in a ProcessPoolExecutor and merges them into results_dir
+  - A seed of None is resolved once here so all shards share it
+
+merge_shards(shard_dirs, results_dir, output_format=None):
+  - Checks that the manifests describe one run (same mode, energies, seed and sampler) and that
+    their history ranges tile [0, total_sims) without gaps or overlaps, raising ValueError otherwise
+  - Standard: rows are copied in history order and numbered globally, so results.csv (or the .npy
+    columns) match a single-process run with the same seed row for row; they are copied
+    file_writing.read_s_chunks blocks at a time, so memory does not grow with the shard size
+  - Generational: tables are summed (padded to the deepest shard); Summary: moments are merged with
+    merge_welford
+  - Writes species.csv, deposition.csv and spectra.csv like a single run and the README with the summed
+    diagnostics; floating point energy totals can differ from a single run in the last bits
+    because they are summed in a different order
+"""
+
+manifest_name = "shard.json"
+run_keys = ["mode", "initial_energy", "cut_off", "seed", "sampler", "points_per_decade", "total_simulations", "spectrum_bins"]
+
+
+def shard_bounds(total_sims, shards):
+    if not 1 <= shards <= total_sims:
+        raise ValueError(f"shards must be between 1 and total_sims ({total_sims}), got {shards}")
+    edges = [total_sims * k // shards for k in range(shards + 1)]
+    return [(edges[k], edges[k + 1] - edges[k]) for k in range(shards)]
+
+
+def run_shard(results_dir, mode, eV, total_sims, min_energy, shard, shards, seed, output_format="npy",
+              sampler="analytic", points_per_decade=100, chunk_size=500, threads=None, spectrum_bins=0):
+    if seed is None:
+        raise ValueError("sharded runs need an explicit seed shared by every shard")
+    if threads is not None:
+        set_num_threads(threads)
+    seed = resolve_seed(seed)
+    first_history, simulations = shard_bounds(total_sims, shards)[shard]
+    shard_dir = Path(results_dir) / f"shard_{shard:04d}"
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "mode": mode,
+        "initial_energy": eV,
+        "cut_off": min_energy,
+        "seed": seed,
+        "sampler": sampler,
+        "points_per_decade": points_per_decade,
+        "total_simulations": total_sims,
+        "spectrum_bins": spectrum_bins,
+        "shard": shard,
+        "shards": shards,
+        "first_history": first_history,
+        "simulations": simulations,
+    }
+    resume, resume_manifest = load_checkpoint(shard_dir)
+    if resume is not None and resume_manifest != dict(manifest, format=output_format):
+        raise ValueError(f"{shard_dir} holds a checkpoint of a different shard or run")
+
+    def checkpoint(state):
+        save_checkpoint(shard_dir, state, dict(manifest, format=output_format))
+
+    options = dict(chunk_size=chunk_size, sampler=sampler, points_per_decade=points_per_decade,
+                   seed=seed, first_history=first_history, checkpoint=checkpoint, resume=resume)
+
+    if mode == "standard":
+        if output_format == "npy":
+            sink = stream_s_npy(shard_dir, code_names, simulations, eV, min_energy, resume=resume is not None)
+        else:
+            sink = stream_s_csv(shard_dir, code_names, resume_from=None if resume is None else resume["completed"])
+        _, t_e, e_a, diagnostics = run_simulations(eV, simulations, min_energy, sink=sink, spectrum_bins=spectrum_bins,
+                                                   stoichiometry=stoichiometry, **options)
+        if output_format == "npy":
+            finalize_s_npy(shard_dir, diagnostics["simulations"])
+        species_count, species_mean, species_m2, species_total = diagnostics["species"]
+        manifest.update(format=output_format, species_count=int(species_count), species_mean=species_mean.tolist(),
+                        species_m2=species_m2.tolist(), species_total=species_total.tolist())
+    elif mode == "summary":
+        count, mean, m2, diagnostics = run_summary_simulations(eV, simulations, min_energy,
+                                                               spectrum_bins=spectrum_bins, **options)
+        total = diagnostics["total"]
+        manifest.update(count=int(count), mean=mean.tolist(), m2=m2.tolist(), total=total.tolist())
+        t_e = total[28]
+        e_a = total[29]
+    elif mode == "generational":
+        data, t_e, e_a, diagnostics = run_generation_simulations(eV, simulations, min_energy, **options)
+        np.save(shard_dir / "generations.npy", data)
+        manifest["generations"] = "generations.npy"
+    else:
+        raise ValueError(f"Unknown mode '{mode}', expected 'standard', 'generational' or 'summary'")
+
+    manifest.update(terminating_energy=float(t_e), attachment_energy=float(e_a),
+                    stack_growths=int(diagnostics["stack_growths"]))
+    if mode != "generational":
+        manifest.update(deposition=diagnostics["deposition"].tolist(),
+                        energy_residual=float(diagnostics["energy_residual"]))
+    if "spectra" in diagnostics:
+        manifest["spectra"] = diagnostics["spectra"].tolist()
+    with open(shard_dir / manifest_name, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    clear_checkpoint(shard_dir)
+    return shard_dir
+
+
+def run_sharded(results_dir, mode, eV, total_sims, min_energy, shards, seed=None, workers=None, threads=1, **options):
+    seed = resolve_seed(seed)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_shard, results_dir, mode, eV, total_sims, min_energy, shard, shards, seed,
+                               threads=threads, **options)
+                   for shard in range(shards)]
+        shard_dirs = [future.result() for future in futures]
+    return merge_shards(shard_dirs, results_dir, options.get("output_format"))
+
+
+def read_manifests(shard_dirs):
+    manifests = []
+    for shard_dir in shard_dirs:
+        with open(Path(shard_dir) / manifest_name, encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest["path"] = Path(shard_dir)
+        manifests.append(manifest)
+    if not manifests:
+        raise ValueError("no shards to merge")
+    for manifest in manifests[1:]:
+        for key in run_keys:
+            if manifest[key] != manifests[0][key]:
+                raise ValueError(f"{manifest['path']} belongs to a different run ({key}: "
+                                 f"{manifest[key]} != {manifests[0][key]})")
+    manifests.sort(key=lambda m: m["first_history"])
+    expected = 0
+    for manifest in manifests:
+        if manifest["first_history"] != expected:
+            raise ValueError(f"histories {expected} to {manifest['first_history'] - 1} are missing or "
+                             f"duplicated (next shard {manifest['path']} starts at {manifest['first_history']})")
+        expected += manifest["simulations"]
+    if expected != manifests[0]["total_simulations"]:
+        raise ValueError(f"shards cover {expected} of {manifests[0]['total_simulations']} histories")
+    return manifests
+
+
+def merge_shards(shard_dirs, results_dir, output_format=None):
+    manifests = read_manifests(shard_dirs)
+    results_dir = Path(results_dir)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    run = manifests[0]
+    eV = run["initial_energy"]
+    cut_off = run["cut_off"]
+    total_sims = run["total_simulations"]
+    terminating_energy = sum(m["terminating_energy"] for m in manifests)
+    electron_attachment = sum(m["attachment_energy"] for m in manifests)
+    diagnostics = {
+        "seed": run["seed"],
+        "stack_growths": sum(m["stack_growths"] for m in manifests),
+        "simulations": total_sims,
+        "shards": len(manifests),
+    }
+    if run["mode"] != "generational":
+        deposition = np.sum([m["deposition"] for m in manifests], axis=0)
+        residual = max(m["energy_residual"] for m in manifests)
+        diagnostics.update(energy_report(eV, deposition, residual))
+        write_deposition_csv(results_dir, deposition, total_sims, eV, code_names)
+    if run["spectrum_bins"] and run["mode"] != "generational":
+        spectra = np.sum([m["spectra"] for m in manifests], axis=0)
+        edges = spectrum_edges(eV, cut_off, run["spectrum_bins"])
+        write_spectra_csv(results_dir, edges, spectra, degradation_spectrum(spectra[0], edges, total_sims), total_sims)
+
+    if run["mode"] == "standard":
+        output_format = output_format or run["format"]
+        if output_format == "npy":
+            arrays = open_s_npy(results_dir, code_names, total_sims, eV, cut_off)
+        else:
+            path = open_s_csv(results_dir, code_names)
+        for manifest in manifests:
+            for start, counts, t_e, e_a in read_s_chunks(manifest["path"]):
+                first = manifest["first_history"] + start
+                if output_format == "npy":
+                    append_s_npy(arrays, counts, t_e, e_a, first)
+                else:
+                    append_s_csv(path, counts, code_names, t_e, e_a, first)
+        species = (0, np.zeros(len(species_names)), np.zeros(len(species_names)))
+        for manifest in manifests:
+            species = merge_welford(*species, manifest["species_count"], np.array(manifest["species_mean"]),
+                                    np.array(manifest["species_m2"]))
+        write_s_readme(results_dir, eV, cut_off, total_sims, terminating_energy, electron_attachment, diagnostics)
+        species_total = np.sum([manifest["species_total"] for manifest in manifests], axis=0)
+        write_species_moments(results_dir, eV, *species, species_total)
+    elif run["mode"] == "summary":
+        count = 0
+        mean = np.zeros(30, dtype=np.float64)
+        m2 = np.zeros(30, dtype=np.float64)
+        for manifest in manifests:
+            count, mean, m2 = merge_welford(count, mean, m2, manifest["count"],
+                                            np.array(manifest["mean"]), np.array(manifest["m2"]))
+        total = np.sum([manifest["total"] for manifest in manifests], axis=0)
+        write_summary_csv(results_dir, count, mean, m2, total, code_names)
+        write_species_summary(results_dir, eV, count, mean, m2, total)
+        write_s_readme(results_dir, eV, cut_off, count, total[28], total[29],
+                       diagnostics, title="Summary Simulation Results")
+    else:
+        tables = [np.load(manifest["path"] / manifest["generations"]) for manifest in manifests]
+        data = np.zeros((max(len(table) for table in tables), 28), dtype=np.int64)
+        for table in tables:
+            data[:len(table)] += table
+        write_g_csv(results_dir, data, code_names)
+        write_species_generations(results_dir, data)
+        write_g_readme(results_dir, eV, cut_off, total_sims, terminating_energy, electron_attachment, diagnostics)
+    return results_dir
@@ -0,0 +1,107 @@
+import numpy as np
+from monte_carlo_sim.simulation.constants import event_names, reaction_produced
+from monte_carlo_sim.simulation.run_simulation import chunk_moments, merge_welford
+from monte_carlo_sim.file_writing.file_writing import write_species_csv, write_g_species_csv
+
+"""
+Species Yields and G-values
+
+constants.reaction_produced lists the products of the 11 reactive events. Here it is turned into a
+(28, n_species) stoichiometry matrix once, so the species produced by any array of event counts,
+one history (28,), many histories (n, 28) or a generation table, are a single matrix product.
+
+Every history deposits its whole incident energy in the gas (the terminating and attachment
+energies stay in the medium too), so the G-value of a species, molecules per 100 eV absorbed, is
+100 * (mean yield per history) / incident energy.
+
+FUNCTIONS:
+
+species_names: products in order of first appearance in reaction_produced (CH₄⁺, CH₃⁺, H*, ...)
+
+stoichiometry_matrix():
+  - stoichiometry[i, s] is the number of species s produced by one event i (0 for the 17
+    non-reactive channels); built once at import as the module constant stoichiometry
+
+species_counts(counts):
+  - counts (..., 28) @ stoichiometry, species produced per row
+
+species_statistics(counts, block_size=1_000_000):
+  - Mean and standard error of the species per history from per-history rows already on disk
+    (e.g. a memory-mapped counts.npy of a finished run)
+  - Works through the rows block_size at a time, merging the moments with merge_welford, so a
+    memory-mapped .npy of 10^7+ histories never has to be loaded or multiplied at once
+  - Returns count, mean (n_species,), std_error (n_species,)
+  - Runs do not need it: run_simulations(stoichiometry=stoichiometry) accumulates the same moments
+    chunk by chunk (diagnostics["species"]) and shards keep them in their manifest
+
+species_bound(count, mean, m2):
+  - Species means from the Welford moments of a summary run (exact, the mean is linear)
+  - The covariances between channels are not kept in a summary run, so the standard error
+    returned is the upper bound sum_i stoichiometry[i, s] * SE_i (from sd(X + Y) <= sd(X) + sd(Y))
+
+g_values(mean, initial_energy): molecules per 100 eV absorbed
+
+write_species_moments(results_dir, initial_energy, count, mean, m2, total) / write_species_summary(results_dir, initial_energy, count, mean, m2, total):
+  - species.csv next to results.csv of a standard / summary run (see file_writing.write_species_csv)
+  - write_species_moments takes the species moments of a standard run (exact standard errors),
+    write_species_summary the 30-column moments of a summary run (error bound)
+  - total is the exact running sum kept next to the moments (species or 30 columns), written as
+    the Total column instead of mean * count
+
+write_species_generations(results_dir, data):
+  - species.csv of a generational run, species totals per generation
+"""
+
+species_names = list(dict.fromkeys(species for products in reaction_produced.values() for species in products))
+
+
+def stoichiometry_matrix():
+    matrix = np.zeros((28, len(species_names)), dtype=np.float64)
+    for event, products in reaction_produced.items():
+        for species, n in products.items():
+            matrix[event_names.index(event), species_names.index(species)] = n
+    return matrix
+
+stoichiometry = stoichiometry_matrix()
+
+
+def species_counts(counts):
+    return np.asarray(counts, dtype=np.float64) @ stoichiometry
+
+
+def species_statistics(counts, block_size=1_000_000):
+    count = 0
+    mean = np.zeros(len(species_names), dtype=np.float64)
+    m2 = np.zeros(len(species_names), dtype=np.float64)
+    for start in range(0, len(counts), block_size):
+        count, mean, m2 = merge_welford(count, mean, m2, *chunk_moments(species_counts(counts[start:start + block_size])))
+    return count, mean, species_error(count, m2)
+
+
+def species_error(count, m2):
+    return np.sqrt(m2 / (count - 1) / count) if count > 1 else np.full(np.shape(m2), np.nan)
+
+
+def species_bound(count, mean, m2):
+    std_error = np.sqrt(m2[:28] / (count - 1) / count) if count > 1 else np.full(28, np.nan)
+    return mean[:28] @ stoichiometry, std_error @ stoichiometry
+
+
+def g_values(mean, initial_energy):
+    return 100 * mean / initial_energy
+
+
+def write_species_moments(results_dir, initial_energy, count, mean, m2, total):
+    std_error = species_error(count, m2)
+    write_species_csv(results_dir, species_names, mean, std_error, total, g_values(mean, initial_energy),
+                      g_values(std_error, initial_energy))
+
+
+def write_species_summary(results_dir, initial_energy, count, mean, m2, total):
+    mean, std_error = species_bound(count, mean, m2)
+    write_species_csv(results_dir, species_names, mean, std_error, total[:28] @ stoichiometry, g_values(mean, initial_energy),
+                      g_values(std_error, initial_energy), error="Standard Error Bound")
+
+
+def write_species_generations(results_dir, data):
+    write_g_species_csv(results_dir, species_counts(data), species_names)
@@ -0,0 +1,148 @@
+import time
+import numpy as np
+from tqdm import tqdm
+from numba import njit, prange, get_num_threads
+from monte_carlo_sim.simulation.sampling import build_sampler
+from monte_carlo_sim.simulation.rng import resolve_seed
+from monte_carlo_sim.simulation.constants import code_names
+from monte_carlo_sim.simulation.run_simulation import sim_generation, generation_capacity
+from monte_carlo_sim.file_writing.file_writing import open_trace, append_trace, write_trace_index, trace_index_dtype
+
+"""
+Per-History Event Traces
+
+The run_* kernels only keep event counts. A trace is the ordered sequence of collisions of one
+history: for collision k the event index, the energy of the electron before the collision and
+its generation, stored as 6-byte records (file_writing.trace_dtype) in trace.bin with an index of
+where each traced history starts (trace_index.npy).
+
+Histories are traced 1 in every: history h is traced when h % every == 0, counted over the run's
+global history numbers, so the overhead is bounded by 1 / every of the run's cost and the same
+histories are traced however a run is chunked or sharded. Because a history's random numbers
+depend only on (seed, history) (see run_simulation.py RANDOM NUMBERS), tracing replays the
+sampled histories with sim_generation after the run instead of slowing down every history of
+run_sim: the trace of history h is the exact collision sequence behind row h of the results.
+
+Each thread block writes into its own preallocated buffer of capacity records per field. When the
+next history does not fit, the block stops, every block's buffer is appended to trace.bin and the
+histories that did not fit run again in the next launch. A history longer than the whole buffer
+doubles capacity, so memory stays at threads * capacity * 6 bytes.
+
+FUNCTIONS:
+
+traced_histories(total_sims, every, first_history=0):
+  - The history numbers in [first_history, first_history + total_sims) that are multiples of every
+
+run_trace_batch(eV, histories, events, energies, generations, min_energy=1, manipulated=-1, sampler=0, tables=None, seed=0, factor=1.10):
+  - events/energies/generations are (blocks, capacity) uint8/float32/uint8 buffers, histories are
+    split into one contiguous block per buffer row
+  - Returns: records (n,), the number of records of each history or -1 if it did not fit, and
+    used (blocks,), the records written to each buffer row (the traced histories of a block are a
+    prefix of its range, in order)
+
+run_traces(results_dir, eV, total_sims, every=1000, min_energy=1, manipulated=-1, sampler="analytic", points_per_decade=100, seed=None, first_history=0, factor=1.10, chunk_size=500, capacity=1 << 18):
+  - Interface on terminal with progress tracking; takes the same arguments as the run it traces
+    (use that run's seed) and writes trace.bin, trace_index.npy and trace.json into results_dir
+  - Returns the index (history, offset, records) sorted by history and a diagnostics dict
+
+warmup_traces(samplers=("analytic", "table")):
+  - Compiles run_trace_batch with the argument types run_traces passes, like run_simulation.warmup
+
+file_writing.load_trace(results_dir) reads a trace back (memory-mapped).
+"""
+
+
+def traced_histories(total_sims, every, first_history=0):
+    first = -(-first_history // every) * every
+    return np.arange(first, first_history + total_sims, every, dtype=np.int64)
+
+
+@njit(parallel=True, cache=True)
+def run_trace_batch(eV, histories, events, energies, generations, min_energy=1, manipulated=-1, sampler=0, tables=None, seed=0, factor=1.10):
+    blocks = events.shape[0]
+    capacity = events.shape[1]
+    n = histories.shape[0]
+    records = np.full(n, -1, dtype=np.int64)
+    used = np.zeros(blocks, dtype=np.int64)
+    for b in prange(blocks):
+        gen_data = np.zeros((generation_capacity(eV, min_energy), 28), dtype=np.int64)
+        for i in range(b * n // blocks, (b + 1) * n // blocks):
+            at = used[b]
+            trace = (events[b, at:], energies[b, at:], generations[b, at:])
+            collisions = sim_generation(eV, gen_data, min_energy=min_energy, sampler=sampler, tables=tables, seed=seed, history=histories[i], manipulated=manipulated, factor=factor, trace=trace)[4]
+            if at + collisions > capacity:
+                break
+            records[i] = collisions
+            used[b] = at + collisions
+    return records, used
+
+
+def trace_buffers(blocks, capacity):
+    return (np.empty((blocks, capacity), dtype=np.uint8), np.empty((blocks, capacity), dtype=np.float32),
+            np.empty((blocks, capacity), dtype=np.uint8))
+
+
+def run_traces(results_dir, eV, total_sims, every=1000, min_energy=1, manipulated=-1, sampler="analytic", points_per_decade=100, seed=None, first_history=0, factor=1.10, chunk_size=500, capacity=1 << 18):
+    started = time.perf_counter()
+    sampler_name = sampler
+    sampler, tables = build_sampler(sampler, eV, min_energy, points_per_decade, manipulated, factor)
+    seed = resolve_seed(seed)
+    pending = traced_histories(total_sims, every, first_history)
+    blocks = max(min(get_num_threads(), len(pending)), 1)
+    events, energies, generations = trace_buffers(blocks, capacity)
+    path = open_trace(results_dir)
+    index = []
+    offset = 0
+    flushes = 0
+    print(f'Tracing {len(pending)} of {total_sims} {eV}eV electron simulations (1 in {every})...')
+
+    with tqdm(total=len(pending), unit="history") as pbar:
+        while len(pending):
+            batch = pending[:chunk_size]
+            n = len(batch)
+            records, used = run_trace_batch(eV, batch, events, energies, generations, min_energy=min_energy, manipulated=manipulated, sampler=sampler, tables=tables, seed=np.uint64(seed), factor=factor)
+            done = records >= 0
+            if not done.any():
+                capacity *= 2
+                events, energies, generations = trace_buffers(blocks, capacity)
+                continue
+            for b in range(blocks):
+                append_trace(path, events[b, :used[b]], energies[b, :used[b]], generations[b, :used[b]])
+                for i in range(b * n // blocks, (b + 1) * n // blocks):
+                    if not done[i]:
+                        break
+                    index.append((batch[i], offset, records[i]))
+                    offset += int(records[i])
+            flushes += 1
+            pending = np.concatenate((batch[~done], pending[chunk_size:]))
+            pbar.update(int(done.sum()))
+
+    index = np.array(index, dtype=trace_index_dtype)
+    write_trace_index(results_dir, index, {
+        "initial_energy": eV,
+        "cut_off": min_energy,
+        "seed": seed,
+        "every": every,
+        "first_history": first_history,
+        "simulations": total_sims,
+        "traced": len(index),
+        "records": offset,
+        "sampler": sampler_name,
+        "manipulated": manipulated,
+        "factor": factor,
+        "events": code_names,
+    })
+    diagnostics = {"seed": seed, "traced": len(index), "records": offset, "flushes": flushes,
+                   "capacity": capacity, "seconds": time.perf_counter() - started}
+    return np.sort(index, order="history"), diagnostics
+
+
+def warmup_traces(samplers=("analytic", "table")):
+    timings = []
+    events, energies, generations = trace_buffers(1, 64)
+    for name in samplers:
+        sampler, tables = build_sampler(name, 20.0, 1.0)
+        start = time.perf_counter()
+        run_trace_batch(20.0, traced_histories(1, 1), events, energies, generations, min_energy=1.0, manipulated=-1, sampler=sampler, tables=tables, seed=np.uint64(0), factor=1.10)
+        timings.append(("run_trace_batch", name, time.perf_counter() - start))
+    return timings
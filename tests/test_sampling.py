@@ -0,0 +1,36 @@
+import math
+import numpy as np
+import pytest
+from monte_carlo_sim.simulation.sampling import build_cs_table, table_bin, compare_samplers
+
+
+def test_table_bin_within_ulps_of_duplicated_nodes():
+    log_grid, cs_table, cell_start = build_cs_table(1e5, 1.0, 100)
+    duplicated = np.nonzero(np.diff(log_grid) == 0)[0]
+    assert len(duplicated) > 0
+    for k in duplicated:
+        below = above = math.exp(log_grid[k])
+        probes = [below]
+        for _ in range(8):
+            below, above = np.nextafter(below, 0.0), np.nextafter(above, np.inf)
+            probes += [below, above]
+        for eV in probes:
+            j, f = table_bin(eV, log_grid, cell_start)
+            x = math.log(eV)
+            assert log_grid[j + 1] > log_grid[j]
+            assert log_grid[j] <= x <= log_grid[j + 1]
+            assert 0.0 <= f <= 1.0
+
+
+def test_table_bin_just_below_a_snapped_breakpoint():
+    log_grid, cs_table, cell_start = build_cs_table(1e5, 1.0, 100)
+    k, f = table_bin(99.99999999999999, log_grid, cell_start)
+    assert log_grid[k] < log_grid[k + 1]
+    assert 0.0 <= f <= 1.0
+
+
+@pytest.mark.parametrize("sampler", ["alias", "table"])
+def test_sampler_matches_analytic(sampler):
+    rows = compare_samplers(np.geomspace(1.5, 50_000, 25), sampler=sampler, reference="analytic", seed=12345)
+    for eV, chi2, dof, z in rows:
+        assert abs(z) < 4, f"{sampler} differs from analytic at {eV} eV (chi2 {chi2:.1f}, dof {dof})"